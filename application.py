@@ -1,3 +1,5 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
 import pygame
@@ -16,7 +18,17 @@ class Application(object):
 
         self.window = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         self.renderer = Renderer(self.window)
-        self.ai = Computer(1, 10)
+        self.ai = Computer(1, 10, use_ponder=True)
+        # Computer thinks in its own thread, so that window keeps responding,
+        # search holds the future of its move while it's running:
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.search = None
+        # Future of search running on player's time, see Computer.ponder:
+        self.ponder = None
+        # Every submitted search has its own cancel event, so that one
+        # cancelled before its thread got to it stops right away:
+        self.search_cancel = None
+        self.ponder_cancel = None
         self.state = State()
 
         self.running = True
@@ -29,11 +41,53 @@ class Application(object):
         self.stack_of_moves = []
 
     def reset(self):
+        self.cancel_search()
+        # Runs in the search thread once the cancelled search has stopped:
+        self.executor.submit(self.ai.reset)
         self.state = State()
         self.stack_of_moves = []
         self.game_over_time = 0
         self.deselect()
 
+    def start_search(self):
+        if self.ponder is not None:
+            # Ponder search already works on this position, it just
+            # becomes the real one:
+            if self.ai.ponderhit(self.state):
+                self.search, self.search_cancel = self.ponder, self.ponder_cancel
+                self.ponder = None
+                return
+            # Otherwise its table entries are kept for the new search:
+            self.cancel_search()
+
+        # Computer gets its own copy, ours keeps being drawn meanwhile:
+        self.search_cancel = threading.Event()
+        self.search = self.executor.submit(
+            self.ai.get_next_best_move,
+            self.state.copy(),
+            cancel_event=self.search_cancel,
+        )
+
+    def start_ponder(self):
+        position = self.ai.prepare_ponder(self.state.copy())
+        self.ponder_cancel = threading.Event()
+        self.ponder = self.executor.submit(
+            self.ai.ponder, position, cancel_event=self.ponder_cancel
+        )
+
+    def cancel_search(self):
+        # Move of a cancelled search is never played:
+        for future, cancel_event in (
+            (self.search, self.search_cancel),
+            (self.ponder, self.ponder_cancel),
+        ):
+            if future is not None:
+                future.cancel()
+                cancel_event.set()
+                self.ai.cancel()
+        self.search = None
+        self.ponder = None
+
     def deselect(self):
         self.selected_tile = None
         self.available_moves = []
@@ -84,9 +138,14 @@ class Application(object):
                     self.user_undo_mechanism()
 
     def gameplay_player_vs_computer(self):
-        # Let computer calculate his move:
-        if self.state.turn_color == Color.DARK:
-            move = self.ai.get_next_best_move(self.state)
+        # Let computer calculate his move, the result is picked up on one
+        # of the following frames:
+        if self.state.turn_color == Color.DARK and self.search is None:
+            self.start_search()
+
+        if self.search is not None and self.search.done():
+            move = self.search.result()
+            self.search = None
 
             if move:
                 self.state.do_move(move)
@@ -95,18 +154,29 @@ class Application(object):
                     self.game_state = GameState.ENDING
                     self.game_over_time = pygame.time.get_ticks()
                     return
+                if self.ai.use_ponder:
+                    self.start_ponder()
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                self.cancel_search()
                 self.running = False
                 break
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:
-                    self.user_selection_gameplay(event)
+                    # Board is ours only while computer isn't thinking:
+                    if self.search is None:
+                        self.user_selection_gameplay(event)
                 elif event.button == 3:
-                    # Undo twice so we end up move before computer started thinking:
-                    self.user_undo_mechanism()
-                    self.user_undo_mechanism()
+                    if self.search is not None:
+                        # Take back our last move, computer stops thinking:
+                        self.cancel_search()
+                        self.user_undo_mechanism()
+                    else:
+                        self.cancel_search()
+                        # Undo twice so we end up move before computer started thinking:
+                        self.user_undo_mechanism()
+                        self.user_undo_mechanism()
 
     def user_selection_gameplay(self, event):
         # Selecting a move is a two step process,
@@ -140,6 +210,8 @@ class Application(object):
                 self.stack_of_moves.append(found_moves[0])
 
                 if self.state.is_terminal():
+                    # Nothing left to ponder on:
+                    self.cancel_search()
                     self.game_state = GameState.ENDING
                     self.game_over_time = pygame.time.get_ticks()
 
@@ -191,4 +263,6 @@ class Application(object):
 
             pygame.display.flip()
 
+        self.cancel_search()
+        self.executor.shutdown()
         pygame.quit()
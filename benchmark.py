@@ -0,0 +1,297 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import sys
+import time
+
+from computer import Computer
+from ordering import NoOrdering
+from parallel import ParallelComputer
+from piece import Color
+from state import State
+
+# Fixed positions, boards are written the same way str(State) prints them:
+POSITIONS = [
+    ("opening", str(State()), Color.LIGHT),
+    (
+        "early middlegame",
+        """
+        0  2  0  2  0  2  0  2
+        2  0  2  0  2  0  2  0
+        0  0  0  2  0  0  0  0
+        2  0  0  0  0  0  0  0
+        0  1  0  2  0  2  0  0
+        1  0  1  0  0  0  1  0
+        0  1  0  0  0  1  0  1
+        1  0  1  0  1  0  1  0
+        """,
+        Color.LIGHT,
+    ),
+    (
+        "middlegame",
+        """
+        0  2  0  0  0  2  0  2
+        2  0  0  0  2  0  2  0
+        0  0  0  2  0  2  0  1
+        2  0  0  0  0  0  0  0
+        0  1  0  0  0  0  0  0
+        0  0  2  0  0  0  1  0
+        0  1  0  0  0  1  0  1
+        1  0  1  0  0  0  1  0
+        """,
+        Color.DARK,
+    ),
+    (
+        "open middlegame",
+        """
+        0  0  0  2  0  2  0  2
+        0  0  0  0  2  0  0  0
+        0  1  0  0  0  0  0  2
+        0  0  2  0  2  0  0  0
+        0  0  0  2  0  0  0  1
+        0  0  0  0  0  0  1  0
+        0  1  0  0  0  0  0  0
+        1  0  1  0  1  0  1  0
+        """,
+        Color.LIGHT,
+    ),
+    (
+        "queens endgame",
+        """
+        0  0  0  11 0  11 0  0
+        2  0  0  0  0  0  0  0
+        0  0  0  0  0  11 0  0
+        0  0  2  0  0  0  1  0
+        0  2  0  2  0  0  0  0
+        0  0  1  0  0  0  0  0
+        0  1  0  0  0  1  0  1
+        1  0  0  0  1  0  0  0
+        """,
+        Color.DARK,
+    ),
+    (
+        "late endgame",
+        """
+        0  0  0  11 0  0  0  11
+        0  0  1  0  0  0  11 0
+        0  0  0  0  0  0  0  0
+        0  0  0  0  0  0  0  0
+        0  0  0  0  0  0  0  2
+        0  0  0  0  0  0  0  0
+        0  0  0  0  0  0  0  0
+        0  0  22 0  0  0  0  0
+        """,
+        Color.DARK,
+    ),
+]
+
+
+def search_position(state, depth, use_ab=True, use_pvs=False, **options):
+    # Single search to a fixed depth, time limit is out of the way,
+    # options are passed on to Computer:
+    ai = Computer(math.inf, depth, **options)
+    state = ai.prepare_state(state)
+    ai.timer.start(ai.time_limit_sec)
+    ai.cur_max_depth = depth
+    ai.tt.clear()
+    ai.pv_lines = [[] for _ in range(depth + 1)]
+    max = state.turn_color == Color.LIGHT
+
+    start = time.perf_counter()
+    if use_pvs:
+        ai.pvs(state, -math.inf, math.inf, 0, 1 if max else -1)
+    elif use_ab:
+        ai.alphabeta(state, -math.inf, math.inf, 0, max)
+    else:
+        ai.minimax(state, 0, max)
+    return ai.nodes, time.perf_counter() - start
+
+
+def search_for_time(
+    state, time_limit_sec, max_depth, use_ab=True, use_pvs=False, workers=1, **options
+):
+    # Iterative deepening as played in a game, within a time budget, with
+    # more than one worker the root moves are shared by ParallelComputer:
+    if workers > 1:
+        ai = ParallelComputer(time_limit_sec, max_depth, workers, **options)
+    else:
+        ai = Computer(time_limit_sec, max_depth, **options)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        best_move = ai.get_next_best_move(state, use_ab, use_pvs)
+    elapsed = time.perf_counter() - start
+    if workers > 1:
+        ai.shutdown()
+
+    # Share of finished depths that already chose the final move:
+    depths = ai.completed_depths
+    same = sum(1 for _, _, move, _ in depths if move == best_move)
+    result = {
+        "nodes": ai.nodes,
+        "seconds": elapsed,
+        "nps": ai.nodes / elapsed,
+        "depth": len(depths),
+        "time_to_depth": [seconds for _, _, _, seconds in depths],
+        "best_move": str(best_move),
+        "stability": same / len(depths) if depths else 0,
+    }
+    if ai.stats is not None:
+        result["stats"] = ai.stats.as_dict()
+    return result
+
+
+def run_fixed_depth(depth, use_ab, use_pvs, options):
+    positions = {}
+    for name, board, turn_color in POSITIONS:
+        state = State.from_string(board, turn_color)
+        nodes, elapsed = search_position(state, depth, use_ab, use_pvs, **options)
+        positions[name] = {"nodes": nodes, "seconds": elapsed, "nps": nodes / elapsed}
+        print(
+            f"{name:20} {nodes:10} nodes {elapsed:8.3f} s {nodes / elapsed:10.0f} n/s"
+        )
+
+    nodes = sum(result["nodes"] for result in positions.values())
+    elapsed = sum(result["seconds"] for result in positions.values())
+    print(
+        f"{'total':20} {nodes:10} nodes {elapsed:8.3f} s {nodes / elapsed:10.0f} n/s"
+    )
+    return {
+        "depth": depth,
+        "positions": positions,
+        "total": {"nodes": nodes, "seconds": elapsed, "nps": nodes / elapsed},
+    }
+
+
+def run_fixed_time(time_limit_sec, max_depth, use_ab, use_pvs, workers, options):
+    positions = {}
+    for name, board, turn_color in POSITIONS:
+        state = State.from_string(board, turn_color)
+        result = search_for_time(
+            state, time_limit_sec, max_depth, use_ab, use_pvs, workers, **options
+        )
+        positions[name] = result
+        times = " ".join(f"{seconds:.2f}" for seconds in result["time_to_depth"])
+        print(
+            f"{name:20} {result['nodes']:10} nodes {result['nps']:10.0f} n/s "
+            f"depth {result['depth']:2} stability {result['stability']:.2f} "
+            f"[{times}]"
+        )
+
+    nodes = sum(result["nodes"] for result in positions.values())
+    elapsed = sum(result["seconds"] for result in positions.values())
+    depth = sum(result["depth"] for result in positions.values()) / len(positions)
+    print(
+        f"{'total':20} {nodes:10} nodes {nodes / elapsed:10.0f} n/s "
+        f"depth {depth:.2f}"
+    )
+    return {
+        "time_limit_sec": time_limit_sec,
+        "positions": positions,
+        "total": {
+            "nodes": nodes,
+            "seconds": elapsed,
+            "nps": nodes / elapsed,
+            "average_depth": depth,
+        },
+    }
+
+
+def compare_with_baseline(results, baseline, threshold):
+    # Throughput of every run that is in both, as a fraction of baseline:
+    runs = [("fixed depth", results.get("fixed_depth"), baseline.get("fixed_depth"))]
+    for key, run in results.get("fixed_time", {}).items():
+        runs.append((f"{key} s", run, baseline.get("fixed_time", {}).get(key)))
+
+    failed = False
+    for name, run, base in runs:
+        if not run or not base:
+            continue
+        if run.get("depth") != base.get("depth"):
+            print(f"{name}: baseline was searched to another depth, skipped")
+            continue
+        ratio = run["total"]["nps"] / base["total"]["nps"]
+        verdict = "ok"
+        if ratio < 1 - threshold:
+            verdict = "REGRESSION"
+            failed = True
+        print(f"{name}: {ratio:6.1%} of baseline n/s {verdict}")
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search speed on fixed positions.")
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument(
+        "--time",
+        type=float,
+        nargs="*",
+        default=[],
+        help="time budgets in seconds to also run iterative deepening with",
+    )
+    parser.add_argument("--max-depth", type=int, default=30)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="processes sharing root moves in the --time runs",
+    )
+    parser.add_argument("--bitboards", action="store_true")
+    parser.add_argument("--minimax", action="store_true")
+    parser.add_argument("--no-ordering", action="store_true")
+    parser.add_argument("--pvs", action="store_true")
+    parser.add_argument("--quiescence", action="store_true")
+    parser.add_argument("--slow-eval", action="store_true")
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--batch", action="store_true")
+    parser.add_argument(
+        "--stats", action="store_true", help="add search statistics to JSON"
+    )
+    parser.add_argument("--tablebase", help="endgame tablebase file to probe")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="allowed drop of n/s compared with baseline, 0.1 is 10%%",
+    )
+    args = parser.parse_args()
+
+    use_ab = not args.minimax
+    options = dict(
+        orderer=NoOrdering() if args.no_ordering else None,
+        use_quiescence=args.quiescence,
+        use_fast_eval=not args.slow_eval,
+        use_incremental_eval=args.incremental,
+        use_bitboards=args.bitboards,
+        batch_leaves=args.batch,
+        collect_stats=args.stats,
+        tablebase=args.tablebase,
+    )
+
+    results = {"options": {k: v for k, v in vars(args).items() if k != "baseline"}}
+    print(f"Fixed depth {args.depth}:")
+    results["fixed_depth"] = run_fixed_depth(args.depth, use_ab, args.pvs, options)
+
+    results["fixed_time"] = {}
+    for time_limit_sec in args.time:
+        print(f"Fixed time {time_limit_sec} s:")
+        results["fixed_time"][str(time_limit_sec)] = run_fixed_time(
+            time_limit_sec, args.max_depth, use_ab, args.pvs, args.workers, options
+        )
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if not compare_with_baseline(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+import struct
+
+from move import EatenInfo, Move
+from piece import Color, Piece, Type
+from utility import *
+from zobrist import PIECE_KEYS, TURN_KEY, compute_hash
+
+# Only dark tiles are playable, so the board is packed into 32 squares,
+# four per row. Square index of tile (row, col) is row * 4 + col // 2.
+SQUARES = 32
+FULL_BOARD = (1 << SQUARES) - 1
+
+# Compact form of a position, as sent to other processes: light, dark and
+# queen masks followed by the turn color:
+POSITION = struct.Struct("<IIIB")
+
+SQ_TO_TILE = [0] * SQUARES
+TILE_TO_SQ = [-1] * (ROWS * COLS)
+for _r in range(ROWS):
+    for _c in range(COLS):
+        if (_r + _c) % 2 == 1:
+            SQ_TO_TILE[_r * 4 + _c // 2] = _r * COLS + _c
+            TILE_TO_SQ[_r * COLS + _c] = _r * 4 + _c // 2
+
+# Diagonal directions, first two lead towards row 0 (light's forward):
+UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT = range(4)
+DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+OPPOSITE = [DOWN_RIGHT, DOWN_LEFT, UP_RIGHT, UP_LEFT]
+LIGHT_FORWARD = (UP_LEFT, UP_RIGHT)
+DARK_FORWARD = (DOWN_LEFT, DOWN_RIGHT)
+ALL_DIRECTIONS = (UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT)
+
+# NEIGHBOUR[sq][dir] is the adjacent square in given direction or -1:
+NEIGHBOUR = [[-1] * 4 for _ in range(SQUARES)]
+for _sq in range(SQUARES):
+    _r, _c = divmod(SQ_TO_TILE[_sq], COLS)
+    for _d, (_dr, _dc) in enumerate(DIRECTIONS):
+        if 0 <= _r + _dr < ROWS and 0 <= _c + _dc < COLS:
+            NEIGHBOUR[_sq][_d] = TILE_TO_SQ[(_r + _dr) * COLS + _c + _dc]
+
+# Depending on row parity, a step in one direction is a shift by 3, 4 or 5
+# squares. SHIFTS[dir] holds (source mask, shift) pairs covering all squares
+# that have a neighbour in that direction:
+SHIFTS = []
+for _d in range(4):
+    _by_delta = {}
+    for _sq in range(SQUARES):
+        if NEIGHBOUR[_sq][_d] != -1:
+            _delta = NEIGHBOUR[_sq][_d] - _sq
+            _by_delta[_delta] = _by_delta.get(_delta, 0) | (1 << _sq)
+    SHIFTS.append(tuple((_mask, _delta) for _delta, _mask in _by_delta.items()))
+
+# Reaching these rows promotes a base piece:
+LIGHT_PROMOTION = sum(1 << _sq for _sq in range(4))
+DARK_PROMOTION = sum(1 << _sq for _sq in range(SQUARES - 4, SQUARES))
+
+# Same tables in tile numbering for State and the tile by tile heuristic.
+# TILE_NEIGHBOUR[tile][dir] is the adjacent tile and TILE_JUMP[tile][dir]
+# the tile two steps away in given direction, -1 when off the board:
+TILE_ROW = [_t // COLS for _t in range(ROWS * COLS)]
+TILE_COL = [_t % COLS for _t in range(ROWS * COLS)]
+TILE_NEIGHBOUR = [[-1] * 4 for _ in range(ROWS * COLS)]
+TILE_JUMP = [[-1] * 4 for _ in range(ROWS * COLS)]
+for _t in range(ROWS * COLS):
+    _r, _c = TILE_ROW[_t], TILE_COL[_t]
+    for _d, (_dr, _dc) in enumerate(DIRECTIONS):
+        if 0 <= _r + _dr < ROWS and 0 <= _c + _dc < COLS:
+            TILE_NEIGHBOUR[_t][_d] = (_r + _dr) * COLS + _c + _dc
+        if 0 <= _r + 2 * _dr < ROWS and 0 <= _c + 2 * _dc < COLS:
+            TILE_JUMP[_t][_d] = (_r + 2 * _dr) * COLS + _c + 2 * _dc
+
+# Tiles (bit per tile) on which base pieces of given color get promoted:
+PROMOTION_TILES = {
+    Color.LIGHT: sum(1 << _t for _t in range(COLS)),
+    Color.DARK: sum(1 << _t for _t in range((ROWS - 1) * COLS, ROWS * COLS)),
+}
+
+# Directions a piece may move in, forward ones first, in the order State
+# has always generated its moves:
+MOVE_DIRECTIONS = {
+    (Color.LIGHT, Type.BASE): (UP_RIGHT, UP_LEFT),
+    (Color.LIGHT, Type.QUEEN): (UP_RIGHT, UP_LEFT, DOWN_RIGHT, DOWN_LEFT),
+    (Color.DARK, Type.BASE): (DOWN_RIGHT, DOWN_LEFT),
+    (Color.DARK, Type.QUEEN): (DOWN_RIGHT, DOWN_LEFT, UP_RIGHT, UP_LEFT),
+}
+
+
+# Shared read-only pieces handed out by BitboardState.atTile:
+EMPTY_PIECE = Piece(Type.EMPTY)
+PIECES = {
+    (color, type): Piece(type, color)
+    for color in Color
+    for type in (Type.BASE, Type.QUEEN)
+}
+
+
+def shift(bb, dir):
+    result = 0
+    for mask, delta in SHIFTS[dir]:
+        if delta > 0:
+            result |= (bb & mask) << delta
+        else:
+            result |= (bb & mask) >> -delta
+    return result
+
+
+def squares_of(bb):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+class BitboardState(object):
+    def __init__(self):
+        # Light pieces start at rows 5..7, dark at rows 0..2:
+        self.light = sum(1 << sq for sq in range(SQUARES - 12, SQUARES))
+        self.dark = sum(1 << sq for sq in range(12))
+        self.queens = 0
+        self.turn_color = Color.LIGHT
+        self.hash_key = compute_hash(self)
+        # Optional IncrementalEvaluation kept in sync with moves:
+        self.evaluation = None
+
+    @classmethod
+    def from_state(cls, state):
+        bb_state = cls()
+        bb_state.light = 0
+        bb_state.dark = 0
+        for sq in range(SQUARES):
+            piece = state.atTile(SQ_TO_TILE[sq])
+            if piece.empty():
+                continue
+            if piece.is_light():
+                bb_state.light |= 1 << sq
+            else:
+                bb_state.dark |= 1 << sq
+            if piece.is_queen():
+                bb_state.queens |= 1 << sq
+        bb_state.turn_color = state.turn_color
+        bb_state.hash_key = compute_hash(bb_state)
+        return bb_state
+
+    @classmethod
+    def from_bytes(cls, data):
+        bb_state = cls()
+        bb_state.light, bb_state.dark, bb_state.queens, turn = POSITION.unpack(data)
+        bb_state.turn_color = Color(turn)
+        bb_state.hash_key = compute_hash(bb_state)
+        return bb_state
+
+    def to_bytes(self):
+        return POSITION.pack(*self.bitboards(), self.turn_color.value)
+
+    def copy(self):
+        # Evaluation isn't copied, searches set up their own:
+        bb_state = self.__class__.__new__(self.__class__)
+        bb_state.light = self.light
+        bb_state.dark = self.dark
+        bb_state.queens = self.queens
+        bb_state.turn_color = self.turn_color
+        bb_state.hash_key = self.hash_key
+        bb_state.evaluation = None
+        return bb_state
+
+    @property
+    def total_lights(self):
+        return self.light.bit_count()
+
+    @property
+    def light_queens(self):
+        return (self.light & self.queens).bit_count()
+
+    @property
+    def total_darks(self):
+        return self.dark.bit_count()
+
+    @property
+    def dark_queens(self):
+        return (self.dark & self.queens).bit_count()
+
+    def state_result(self, moves=None):
+        if self.light == 0:
+            return StateResult.DARK_WON
+        if self.dark == 0:
+            return StateResult.LIGHT_WON
+        if moves is None:
+            if not self.has_moves():
+                return StateResult.DRAW
+        elif len(moves) == 0:
+            return StateResult.DRAW
+        return StateResult.PLAYING
+
+    def is_terminal(self):
+        return self.state_result() != StateResult.PLAYING
+
+    def __str__(self):
+        output = []
+        for r in range(ROWS):
+            row = []
+            for c in range(COLS):
+                row.append(str(self.at(r, c)))
+            row.append("\n")
+            output.append(" ".join(row))
+        return "".join(output)
+
+    def __repr__(self):
+        return str(self)
+
+    def atTile(self, tile):
+        # Returned pieces are shared, they must not be modified:
+        sq = TILE_TO_SQ[tile]
+        if sq == -1:
+            return EMPTY_PIECE
+        bit = 1 << sq
+        if not (self.light | self.dark) & bit:
+            return EMPTY_PIECE
+        color = Color.LIGHT if self.light & bit else Color.DARK
+        return PIECES[(color, Type.QUEEN if self.queens & bit else Type.BASE)]
+
+    def at(self, row, col):
+        return self.atTile(row * COLS + col)
+
+    def bitboards(self):
+        return self.light, self.dark, self.queens
+
+    def change_turn_color(self):
+        self.hash_key ^= TURN_KEY
+        if self.turn_color == Color.DARK:
+            self.turn_color = Color.LIGHT
+        else:
+            self.turn_color = Color.DARK
+
+    def get_all_turn_moves(self):
+        all_moves = []
+        if self.turn_color == Color.LIGHT:
+            own, opp = self.light, self.dark
+            forward, promotion = LIGHT_FORWARD, LIGHT_PROMOTION
+        else:
+            own, opp = self.dark, self.light
+            forward, promotion = DARK_FORWARD, DARK_PROMOTION
+
+        empty = ~(own | opp) & FULL_BOARD
+        queens = own & self.queens
+        bases = own & ~self.queens
+
+        # Simple moves, all pieces of one direction shifted at once:
+        for dir in ALL_DIRECTIONS:
+            movers = own if dir in forward else queens
+            back = OPPOSITE[dir]
+            for dest in squares_of(shift(movers, dir) & empty):
+                start = NEIGHBOUR[dest][back]
+                promoted = bool(bases & (1 << start) and promotion & (1 << dest))
+                all_moves.append(
+                    Move(SQ_TO_TILE[start], SQ_TO_TILE[dest], None, promoted)
+                )
+
+        # Only pieces that have an enemy next to them with a free square
+        # behind it can start a jump:
+        jumpers = 0
+        for dir in ALL_DIRECTIONS:
+            movers = own if dir in forward else queens
+            landings = shift(shift(movers, dir) & opp, dir) & empty
+            if landings:
+                back = OPPOSITE[dir]
+                jumpers |= shift(shift(landings, back), back)
+
+        for start in squares_of(jumpers):
+            self.generate_jumps_for_square(start, all_moves)
+        return all_moves
+
+    def has_moves(self):
+        if self.turn_color == Color.LIGHT:
+            own, opp, forward = self.light, self.dark, LIGHT_FORWARD
+        else:
+            own, opp, forward = self.dark, self.light, DARK_FORWARD
+        empty = ~(own | opp) & FULL_BOARD
+
+        # Any free square next to a piece, or behind an adjacent enemy:
+        for dir in ALL_DIRECTIONS:
+            movers = own if dir in forward else own & self.queens
+            if not movers:
+                continue
+            step = shift(movers, dir)
+            if step & empty or shift(step & opp, dir) & empty:
+                return True
+        return False
+
+    def generate_moves_for_tile(self, org_tile, all_moves):
+        start = TILE_TO_SQ[org_tile]
+        if start == -1:
+            return
+        own = self.light if self.turn_color == Color.LIGHT else self.dark
+        bit = 1 << start
+        if not own & bit:
+            return
+
+        if self.queens & bit:
+            dirs = ALL_DIRECTIONS
+        elif self.turn_color == Color.LIGHT:
+            dirs = LIGHT_FORWARD
+        else:
+            dirs = DARK_FORWARD
+        promotion = (
+            LIGHT_PROMOTION if self.turn_color == Color.LIGHT else DARK_PROMOTION
+        )
+        occupied = self.light | self.dark
+
+        for dir in dirs:
+            dest = NEIGHBOUR[start][dir]
+            if dest != -1 and not occupied & (1 << dest):
+                promoted = bool(not self.queens & bit and promotion & (1 << dest))
+                all_moves.append(
+                    Move(org_tile, SQ_TO_TILE[dest], None, promoted)
+                )
+        self.generate_jumps_for_square(start, all_moves)
+
+    def generate_jumps_for_square(self, start, all_moves):
+        if self.turn_color == Color.LIGHT:
+            opp, forward, promotion = self.dark, LIGHT_FORWARD, LIGHT_PROMOTION
+        else:
+            opp, forward, promotion = self.light, DARK_FORWARD, DARK_PROMOTION
+        is_base = not self.queens & (1 << start)
+        dirs = forward if is_base else ALL_DIRECTIONS
+        occupied = self.light | self.dark
+
+        # Jumping chains are explored depth first with an explicit stack,
+        # board stays untouched so captured pieces still block the way:
+        stack = [(start, None, (), 1 << start)]
+        while stack:
+            current, came_from, eaten, path = stack.pop()
+            for dir in dirs:
+                if dir == came_from:
+                    continue
+                mid = NEIGHBOUR[current][dir]
+                if mid == -1 or not opp & (1 << mid):
+                    continue
+                land = NEIGHBOUR[mid][dir]
+                if land == -1 or occupied & (1 << land):
+                    continue
+
+                mid_type = Type.QUEEN if self.queens & (1 << mid) else Type.BASE
+                new_eaten = eaten + (
+                    EatenInfo(SQ_TO_TILE[mid], mid_type, self.opposite_color()),
+                )
+                promoted = is_base and bool(promotion & (1 << land))
+                all_moves.append(
+                    Move(SQ_TO_TILE[start], SQ_TO_TILE[land], new_eaten, promoted)
+                )
+
+                # Chain can't continue through an already visited square:
+                if not path & (1 << land):
+                    stack.append((land, OPPOSITE[dir], new_eaten, path | (1 << land)))
+
+    def opposite_color(self):
+        return Color.DARK if self.turn_color == Color.LIGHT else Color.LIGHT
+
+    def do_move(self, move: Move):
+        start = 1 << TILE_TO_SQ[move.start]
+        dest = 1 << TILE_TO_SQ[move.dest]
+
+        # Moving the piece, together with its queen flag:
+        if self.turn_color == Color.LIGHT:
+            self.light ^= start | dest
+        else:
+            self.dark ^= start | dest
+        if self.queens & start:
+            self.queens ^= start | dest
+            keys = PIECE_KEYS[(self.turn_color, Type.QUEEN)]
+            self.hash_key ^= keys[move.start] ^ keys[move.dest]
+        else:
+            self.hash_key ^= PIECE_KEYS[(self.turn_color, Type.BASE)][move.start]
+            if move.promoted:
+                self.queens |= dest
+                self.hash_key ^= PIECE_KEYS[(self.turn_color, Type.QUEEN)][move.dest]
+            else:
+                self.hash_key ^= PIECE_KEYS[(self.turn_color, Type.BASE)][move.dest]
+
+        # Removing eaten pieces, all at once:
+        if move.eaten:
+            kept = ~move.captured_squares
+            self.light &= kept
+            self.dark &= kept
+            self.queens &= kept
+            for info in move.eaten:
+                self.hash_key ^= PIECE_KEYS[(info.p_color, info.p_type)][info.tile]
+
+        if self.evaluation is not None:
+            self.evaluation.do_move(move)
+
+        self.change_turn_color()
+
+    def undo_move(self, move: Move):
+        self.change_turn_color()
+
+        start = 1 << TILE_TO_SQ[move.start]
+        dest = 1 << TILE_TO_SQ[move.dest]
+
+        # Moving the piece back, demoting it if the move promoted it:
+        if self.turn_color == Color.LIGHT:
+            self.light ^= start | dest
+        else:
+            self.dark ^= start | dest
+        if move.promoted:
+            self.queens &= ~dest
+            self.hash_key ^= PIECE_KEYS[(self.turn_color, Type.QUEEN)][move.dest]
+            self.hash_key ^= PIECE_KEYS[(self.turn_color, Type.BASE)][move.start]
+        elif self.queens & dest:
+            self.queens ^= start | dest
+            keys = PIECE_KEYS[(self.turn_color, Type.QUEEN)]
+            self.hash_key ^= keys[move.start] ^ keys[move.dest]
+        else:
+            keys = PIECE_KEYS[(self.turn_color, Type.BASE)]
+            self.hash_key ^= keys[move.start] ^ keys[move.dest]
+
+        # Reviving eaten pieces, all of them are of opponent's color:
+        if move.eaten:
+            if self.turn_color == Color.LIGHT:
+                self.dark |= move.captured_squares
+            else:
+                self.light |= move.captured_squares
+            self.queens |= move.captured_queens
+            for info in move.eaten:
+                self.hash_key ^= PIECE_KEYS[(info.p_color, info.p_type)][info.tile]
+
+        if self.evaluation is not None:
+            self.evaluation.undo_move()
@@ -0,0 +1,164 @@
+import argparse
+import contextlib
+import io
+import math
+import random
+import struct
+import time
+
+from piece import Color
+from state import State
+
+# File holds magic, version and number of records, then records sorted by
+# position hash. Move is told by its start and dest tiles and by the mask
+# of eaten tiles, which tells apart jumps ending on the same tile:
+MAGIC = b"CKBK"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+RECORD = struct.Struct("<QBBQH")
+
+# Weight of the best move of a position, others get less the further they
+# are from it:
+MAX_WEIGHT = 100
+
+
+class Book(object):
+    def __init__(self, path, seed=None):
+        self.path = path
+        with open(path, "rb") as file:
+            self.data = file.read()
+        magic, version, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an opening book file")
+        self.rng = random.Random(seed)
+
+    def key_at(self, i):
+        return RECORD.unpack_from(self.data, HEADER.size + i * RECORD.size)[0]
+
+    def entries(self, key):
+        # (start, dest, captured, weight) of all records of a position,
+        # found by binary search for the first one:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        result = []
+        for i in range(low, self.count):
+            record = RECORD.unpack_from(self.data, HEADER.size + i * RECORD.size)
+            if record[0] != key:
+                break
+            result.append(record[1:])
+        return result
+
+    def moves(self, state):
+        # Legal book moves of the position with their weights:
+        entries = self.entries(state.hash_key)
+        if not entries:
+            return []
+        weights = {(start, dest, captured): w for start, dest, captured, w in entries}
+        result = []
+        for move in state.get_all_turn_moves():
+            weight = weights.get((move.start, move.dest, move.captured))
+            if weight:
+                result.append((move, weight))
+        return result
+
+    def choose(self, state):
+        moves = self.moves(state)
+        if not moves:
+            return None
+        return self.rng.choices(
+            [move for move, _ in moves], [weight for _, weight in moves]
+        )[0]
+
+
+def score_moves(ai, state, depth):
+    # Every move searched on its own to given depth, scores are from the
+    # view of the side on turn:
+    sign = 1 if state.turn_color == Color.LIGHT else -1
+    ai.max_depth = depth
+    scored = []
+    for i, move in enumerate(state.get_all_turn_moves()):
+        ai.root_moves = [move]
+        with contextlib.redirect_stdout(io.StringIO()):
+            ai.iterative_deepening(state, True, clear_cache=i == 0)
+        scored.append((move, sign * ai.completed_depths[-1][1]))
+    ai.root_moves = None
+    return scored
+
+
+def book_weights(scored, margin):
+    # Moves within margin of the best one, weighted by how close they are:
+    best = max(score for _, score in scored)
+    if math.isinf(best) or margin <= 0:
+        return [(move, MAX_WEIGHT) for move, score in scored if score == best]
+    result = []
+    for move, score in scored:
+        if best - score <= margin:
+            weight = max(1, round(MAX_WEIGHT * (1 - (best - score) / margin)))
+            result.append((move, weight))
+    return result
+
+
+def build(plies, depth, margin, verbose=True):
+    # Book positions are the ones reached by book moves from the initial
+    # position, records are (key, start, dest, captured, weight). Computer
+    # is imported here, as it imports this module itself:
+    from computer import Computer
+
+    ai = Computer(math.inf, depth)
+    records = []
+    frontier = [State()]
+    for ply in range(plies):
+        seen = set()
+        next_frontier = []
+        start = time.perf_counter()
+        for state in frontier:
+            if state.hash_key in seen or state.is_terminal():
+                continue
+            seen.add(state.hash_key)
+
+            for move, weight in book_weights(score_moves(ai, state, depth), margin):
+                records.append(
+                    (state.hash_key, move.start, move.dest, move.captured, weight)
+                )
+                child = state.copy()
+                child.do_move(move)
+                next_frontier.append(child)
+        frontier = next_frontier
+        if verbose:
+            print(
+                f"ply {ply + 1}: {len(seen)} positions, {len(records)} records "
+                f"in {time.perf_counter() - start:.1f} s"
+            )
+    return records
+
+
+def write(path, records):
+    records = sorted(records)
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        for record in records:
+            file.write(RECORD.pack(*record))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Opening book builder.")
+    parser.add_argument("--plies", type=int, default=6)
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument(
+        "--margin", type=float, default=1.0, help="score loss allowed for book moves"
+    )
+    parser.add_argument("--output", default="book.bin")
+    args = parser.parse_args()
+
+    records = build(args.plies, args.depth, args.margin)
+    write(args.output, records)
+    print(f"Written {args.output}")
+
+
+if __name__ == "__main__":
+    main()
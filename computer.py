@@ -1,59 +1,343 @@
 import math
-import time
-from copy import deepcopy
 
+from book import Book
+from bitboard import (
+    DOWN_LEFT,
+    DOWN_RIGHT,
+    MOVE_DIRECTIONS,
+    TILE_COL,
+    TILE_JUMP,
+    TILE_NEIGHBOUR,
+    TILE_ROW,
+    UP_LEFT,
+    UP_RIGHT,
+    BitboardState,
+)
+from evaluator import IncrementalEvaluation, evaluate_batch, evaluate_bitboards
+from ordering import MoveOrderer
 from piece import Color
+from stats import SearchStats
+from tablebase import Tablebase
+from timing import TimeManager
+from transposition import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable
 from utility import *
 
+# Width of the window used to only test whether a move beats alpha:
+NULL_WINDOW = 1e-3
+
 
 class Computer(object):
-    def __init__(self, time_limit_sec, max_depth):
+    def __init__(
+        self,
+        time_limit_sec,
+        max_depth,
+        use_bitboards=False,
+        tt_size_mb=16,
+        orderer=None,
+        aspiration_window=2.5,
+        aspiration_widening=4,
+        use_quiescence=False,
+        quiescence_budget=64,
+        use_fast_eval=True,
+        use_incremental_eval=False,
+        batch_leaves=False,
+        batch_evaluator=evaluate_batch,
+        collect_stats=False,
+        time_manager=None,
+        use_ponder=False,
+        tablebase=None,
+        book=None,
+    ):
         self.time_limit_sec = time_limit_sec
+        # Decides when to look at the clock and whether to start next depth:
+        self.timer = time_manager if time_manager is not None else TimeManager()
+        # Keep searching on opponent's time, see ponder:
+        self.use_ponder = use_ponder
+        # Hash of position that ponder search is searching for our move,
+        # None when it searches opponent's position instead:
+        self.ponder_key = None
+        # Endgame positions with few enough pieces are looked up instead
+        # of searched, given as Tablebase or path to its file:
+        if isinstance(tablebase, str):
+            tablebase = Tablebase(tablebase)
+        self.tablebase = tablebase
+        # Opening book consulted before searching, Book or path to its file:
+        if isinstance(book, str):
+            book = Book(book)
+        self.book = book
         self.max_depth = max_depth
+        # Search on a bitboard copy of the given state instead of tiles:
+        self.use_bitboards = use_bitboards
+        self.tt = TranspositionTable(tt_size_mb)
+        self.orderer = orderer if orderer is not None else MoveOrderer()
+        # Each depth first searches around previous depth's score, window
+        # is widened by given factor whenever the score falls outside:
+        self.aspiration_window = aspiration_window
+        self.aspiration_widening = aspiration_widening
+        # Leaves are extended through capture sequences, each leaf may
+        # visit at most quiescence_budget capture nodes:
+        self.use_quiescence = use_quiescence
+        self.quiescence_budget = quiescence_budget
+        self.quiescence_nodes_left = 0
+        # Evaluate with masks over whole board instead of tile by tile,
+        # both give the same scores:
+        self.use_fast_eval = use_fast_eval
+        # Keep the score updated by do_move/undo_move of searched state:
+        self.use_incremental_eval = use_incremental_eval
+        # Children of the last searched ply are scored together in one
+        # call of batch_evaluator, which takes a list of bitboards:
+        self.batch_leaves = batch_leaves
+        self.batch_evaluator = batch_evaluator
+        # SearchStats of last search, None when they aren't collected:
+        self.stats = SearchStats() if collect_stats else None
         self.cur_max_depth = 1
         self.best_move = None
         self.cur_best_move = None
+        # Best root move of an unfinished depth, set only once its score
+        # is known to beat the window:
+        self.partial_best_move = None
+        self.partial_pv = []
+        # (depth, score, best move, seconds since start) of every finished
+        # depth of last search:
+        self.completed_depths = []
+        # When set, only these moves are searched in the root:
+        self.root_moves = None
         self.max_player = None
-        self.start_time_point = None
-
-    def iterative_deepening(self, state, use_ab):
-        working_state = deepcopy(state)
+        self.nodes = 0
+        # Expected line of play from the root, best move first:
+        self.principal_variation = []
+        self.pv_lines = []
+        # Rest of the expected line from every position along it, by hash,
+        # a later search of any of them starts with its line:
+        self.pv_moves = {}
+
+    def prepare_state(self, state):
+        # Search works on its own copy of the state:
+        if self.use_bitboards:
+            working_state = BitboardState.from_state(state)
+        else:
+            working_state = state.copy()
+        if self.use_incremental_eval:
+            working_state.evaluation = IncrementalEvaluation(
+                *working_state.bitboards()
+            )
+        return working_state
+
+    def reset(self):
+        # Forgets all earlier searches, for a new game:
+        self.tt.clear()
+        self.orderer.clear()
+        self.best_move = None
+        self.principal_variation = []
+        self.pv_moves = {}
+        self.ponder_key = None
+
+    def iterative_deepening(
+        self,
+        state,
+        use_ab,
+        use_pvs=False,
+        time_limit_sec=None,
+        clear_cache=False,
+        cancel_event=None,
+    ):
+        working_state = self.prepare_state(state)
         max = working_state.turn_color == Color.LIGHT
+        if time_limit_sec is None:
+            time_limit_sec = self.time_limit_sec
 
+        # Table, move ordering and expected line of earlier searches are
+        # kept, the position was most likely reached along that line:
+        if clear_cache:
+            self.reset()
+        else:
+            self.tt.new_search()
+            self.orderer.age()
         self.best_move = None
-        self.start_time_point = time.perf_counter()
-
+        self.principal_variation = []
+        if self.root_moves is None:
+            self.principal_variation = self.pv_moves.get(working_state.hash_key, [])
+        if self.principal_variation:
+            self.best_move = self.principal_variation[0]
+        self.completed_depths = []
+        self.nodes = 0
+        if self.stats is not None:
+            self.stats.clear()
+        self.timer.start(time_limit_sec, working_state, self.nodes, cancel_event)
+
+        score = None
         for d in range(1, self.max_depth + 1):
+            # Depth that can't finish in time would only waste it:
+            if not self.timer.next_iteration_fits():
+                break
             self.cur_max_depth = d
+            self.partial_best_move = None
+            self.timer.start_iteration(self.nodes)
+            iteration_nodes = self.nodes
             try:
-                if use_ab:
-                    self.alphabeta(working_state, -math.inf, math.inf, 0, max)
+                if use_ab or use_pvs:
+                    score = self.aspiration_search(working_state, max, use_pvs, score)
                 else:
-                    self.minimax(working_state, 0, max)
+                    self.pv_lines = [[] for _ in range(d + 1)]
+                    score = self.minimax(working_state, 0, max)
                 self.best_move = self.cur_best_move
+                self.principal_variation = self.pv_lines[0]
+                self.timer.finish_iteration(self.nodes)
+                elapsed = self.timer.elapsed()
+                self.completed_depths.append((d, score, self.best_move, elapsed))
+                if self.stats is not None:
+                    seconds = self.timer.iteration_times[-1]
+                    self.stats.iterations.append(
+                        (d, seconds, self.nodes - iteration_nodes)
+                    )
             except TimeOutException:
+                # Previous best move is searched first, so any move that
+                # replaced it in the unfinished depth is the better choice:
+                if self.partial_best_move is not None:
+                    self.best_move = self.partial_best_move
+                    self.principal_variation = self.partial_pv
                 break
 
+        if self.stats is not None:
+            self.stats.nodes = self.nodes
+        self.remember_pv(state)
         print(f"We reached depth {self.cur_max_depth}")
         return self.best_move
 
-    def get_next_best_move(self, state, use_ab=True):
+    def remember_pv(self, state):
+        # Timeout may leave the searched state in the middle of a line, so
+        # the expected line is walked on a fresh copy. do_move can't take
+        # illegal moves, so the walk stops at the first one:
+        state = state.copy()
+        self.pv_moves = {}
+        line = self.principal_variation
+        for i, move in enumerate(line):
+            if move not in state.get_all_turn_moves():
+                break
+            self.pv_moves[state.hash_key] = line[i:]
+            state.do_move(move)
+
+    def aspiration_search(self, state, max, use_pvs, prev_score):
+        delta = self.aspiration_window
+        if not delta or prev_score is None or math.isinf(prev_score):
+            return self.search_root(state, -math.inf, math.inf, max, use_pvs)
+
+        alpha, beta = prev_score - delta, prev_score + delta
+        while True:
+            score = self.search_root(state, alpha, beta, max, use_pvs)
+            if score <= alpha and alpha != -math.inf:
+                delta *= self.aspiration_widening
+                alpha = score - delta
+            elif score >= beta and beta != math.inf:
+                delta *= self.aspiration_widening
+                beta = score + delta
+            else:
+                return score
+            # Move that beat the previous best goes first in the re-search,
+            # so that running out of time can't bring the worse one back:
+            if self.partial_best_move is not None:
+                self.best_move = self.partial_best_move
+
+    def search_root(self, state, alpha, beta, max, use_pvs):
+        # Returns score from light's view, whichever search is used:
+        self.pv_lines = [[] for _ in range(self.cur_max_depth + 1)]
+        if not use_pvs:
+            return self.alphabeta(state, alpha, beta, 0, max)
+        if max:
+            return self.pvs(state, alpha, beta, 0, 1)
+        return -self.pvs(state, -beta, -alpha, 0, -1)
+
+    def cancel(self):
+        # May be called from another thread, running search stops at its
+        # next clock check and returns the best move found so far:
+        self.timer.cancel()
+
+    def prepare_ponder(self, state):
+        # Called right after our move with opponent on turn. Expected reply
+        # from principal variation is played and our answer searched, when
+        # there is none, opponent's position is searched, which fills the
+        # table for all replies. Returns the position for ponder:
+        self.ponder_key = None
+        self.timer.expect_ponder()
+        if len(self.principal_variation) > 1:
+            expected = self.principal_variation[1]
+            if expected in state.get_all_turn_moves():
+                state = state.copy()
+                state.do_move(expected)
+                self.ponder_key = state.hash_key
+        return state
+
+    def ponder(self, state, use_ab=True, use_pvs=False, cancel_event=None):
+        # Searches without time limit until cancelled, or until ponderhit
+        # gives it one, in which case the result is our next move:
+        print("Pondering...")
+        return self.iterative_deepening(
+            state, use_ab, use_pvs, math.inf, cancel_event=cancel_event
+        )
+
+    def ponderhit(self, state):
+        # Opponent played the expected move, running ponder search carries
+        # on as the real one with time limit counted from now:
+        if self.ponder_key is None or self.ponder_key != state.hash_key:
+            return False
+        self.timer.ponderhit(self.time_limit_sec)
+        return True
+
+    def skip_search(self, move):
+        # Move is played without searching, counters of last search are
+        # cleared so that callers don't count them again:
+        self.nodes = 0
+        self.completed_depths = []
+        if self.stats is not None:
+            self.stats.clear()
+        self.best_move = move
+        self.principal_variation = [move] if move is not None else []
+        return move
+
+    def get_next_best_move(
+        self, state, use_ab=True, use_pvs=False, clear_cache=False, cancel_event=None
+    ):
+        if self.book is not None:
+            move = self.book.choose(state)
+            if move is not None:
+                print(f"Book move is {move}")
+                return self.skip_search(move)
+
         print("Thinking...")
-        best_move = self.iterative_deepening(state, use_ab)
+        best_move = self.iterative_deepening(
+            state, use_ab, use_pvs, clear_cache=clear_cache, cancel_event=cancel_event
+        )
         print(f"Best move is {best_move}")
+        print(f"Expected line is {self.principal_variation}")
+        if self.stats is not None:
+            print(self.stats)
         return best_move
 
     # Expect deep copy of a state as initial parameter state:
     def minimax(self, state, depth, max):
-        if time.perf_counter() - self.start_time_point > self.time_limit_sec:
-            raise TimeOutException()
-
-        if state.is_terminal() or depth >= self.cur_max_depth:
+        self.nodes += 1
+        if self.nodes >= self.timer.next_check:
+            self.timer.check(self.nodes)
+        stats = self.stats
+        if depth >= self.cur_max_depth:
+            if stats is not None:
+                stats.leaves += 1
             return self.eval_state(state)
 
+        # Moves are generated once and reused for terminal check:
+        moves = state.get_all_turn_moves()
+        result = state.state_result(moves)
+        if result != StateResult.PLAYING:
+            return self.eval_result(result)
+        if depth == 0 and self.root_moves is not None:
+            moves = [move for move in moves if move in self.root_moves]
+        if stats is not None:
+            stats.expanded += 1
+            stats.children += len(moves)
+
         if max:
             v = -math.inf
-            for move in state.get_all_turn_moves():
+            for move in moves:
                 state.do_move(move)
                 new_v = self.minimax(state, depth + 1, False)
                 state.undo_move(move)
@@ -63,7 +347,7 @@ class Computer(object):
                         self.cur_best_move = move
         else:
             v = math.inf
-            for move in state.get_all_turn_moves():
+            for move in moves:
                 state.do_move(move)
                 new_v = self.minimax(state, depth + 1, True)
                 state.undo_move(move)
@@ -74,68 +358,367 @@ class Computer(object):
         return v
 
     def alphabeta(self, state, alpha, beta, depth, max):
-        if time.perf_counter() - self.start_time_point > self.time_limit_sec:
-            raise TimeOutException()
-
-        if state.is_terminal() or depth >= self.cur_max_depth:
+        self.nodes += 1
+        if self.nodes >= self.timer.next_check:
+            self.timer.check(self.nodes)
+        stats = self.stats
+        # Line is cleared before any return, parent would otherwise take
+        # the one left here by a sibling:
+        self.pv_lines[depth] = []
+        # Leaves are probed by eval_state or quiescence:
+        if self.tablebase is not None and 0 < depth < self.cur_max_depth:
+            score = self.probe_tablebase(state)
+            if score is not None:
+                return score
+        if depth >= self.cur_max_depth:
+            if stats is not None:
+                stats.leaves += 1
+            if self.use_quiescence:
+                self.quiescence_nodes_left = self.quiescence_budget
+                if max:
+                    return self.quiescence(state, alpha, beta, 1)
+                return -self.quiescence(state, -beta, -alpha, -1)
             return self.eval_state(state)
 
+        # Position might have been searched already, deep enough result
+        # can narrow the window or even replace the search (not in root,
+        # where we still need to pick the move):
+        remaining = self.cur_max_depth - depth
+        entry = self.tt.probe(state.hash_key)
+        hash_move = None
+        if stats is not None:
+            stats.tt_probes += 1
+            stats.tt_hits += entry is not None
+        if entry is not None:
+            _, e_depth, e_flag, e_score, hash_move = entry
+            if e_depth >= remaining and depth > 0:
+                if e_flag == LOWER_BOUND and e_score > alpha:
+                    alpha = e_score
+                elif e_flag == UPPER_BOUND and e_score < beta:
+                    beta = e_score
+                if e_flag == EXACT or alpha >= beta:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
+                    return e_score
+
+        # Moves are generated once and reused for terminal check:
+        moves = state.get_all_turn_moves()
+        result = state.state_result(moves)
+        if result != StateResult.PLAYING:
+            return self.eval_result(result)
+        if depth == 0 and self.root_moves is not None:
+            moves = [move for move in moves if move in self.root_moves]
+        if stats is not None:
+            stats.expanded += 1
+            stats.children += len(moves)
+
+        # Best move from previous iteration (or earlier search of this
+        # position) goes first, other moves by their likeliness to cut:
+        if depth == 0 and self.best_move is not None:
+            hash_move = self.best_move
+        moves = self.orderer.order(moves, depth, hash_move)
+
+        leaf_scores = None
+        if remaining == 1 and self.batch_leaves and not self.use_quiescence:
+            leaf_scores = self.eval_children(state, moves)
+
+        org_alpha, org_beta = alpha, beta
+        best_move = None
         if max:
             v = -math.inf
-            for move in state.get_all_turn_moves():
-                state.do_move(move)
-                new_v = self.alphabeta(state, alpha, beta, depth + 1, False)
-                state.undo_move(move)
-                if new_v > v:
+            for i, move in enumerate(moves):
+                if leaf_scores is not None:
+                    new_v = leaf_scores[i]
+                else:
+                    state.do_move(move)
+                    new_v = self.alphabeta(state, alpha, beta, depth + 1, False)
+                    state.undo_move(move)
+                if new_v > v or best_move is None:
                     v = new_v
+                    best_move = move
+                    self.pv_lines[depth] = [move] + self.pv_lines[depth + 1]
                     if depth == 0:
                         self.cur_best_move = move
+                        if new_v > org_alpha:
+                            self.partial_best_move = move
+                            self.partial_pv = self.pv_lines[0]
                 if new_v >= beta:
-                    return v
+                    self.orderer.record_cutoff(move, depth, remaining)
+                    if stats is not None:
+                        stats.cutoffs += 1
+                        stats.first_move_cutoffs += i == 0
+                    break
                 if new_v > alpha:
                     alpha = new_v
         else:
             v = math.inf
-            for move in state.get_all_turn_moves():
-                state.do_move(move)
-                new_v = self.alphabeta(state, alpha, beta, depth + 1, True)
-                state.undo_move(move)
-                if new_v < v:
+            for i, move in enumerate(moves):
+                if leaf_scores is not None:
+                    new_v = leaf_scores[i]
+                else:
+                    state.do_move(move)
+                    new_v = self.alphabeta(state, alpha, beta, depth + 1, True)
+                    state.undo_move(move)
+                if new_v < v or best_move is None:
                     v = new_v
+                    best_move = move
+                    self.pv_lines[depth] = [move] + self.pv_lines[depth + 1]
                     if depth == 0:
                         self.cur_best_move = move
+                        if new_v < org_beta:
+                            self.partial_best_move = move
+                            self.partial_pv = self.pv_lines[0]
                 if new_v <= alpha:
-                    return v
+                    self.orderer.record_cutoff(move, depth, remaining)
+                    if stats is not None:
+                        stats.cutoffs += 1
+                        stats.first_move_cutoffs += i == 0
+                    break
                 if new_v < beta:
                     beta = new_v
+
+        if v <= org_alpha:
+            flag = UPPER_BOUND
+        elif v >= org_beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        # Root searched with some moves left out isn't worth remembering:
+        if depth > 0 or self.root_moves is None:
+            self.tt.store(state.hash_key, remaining, flag, v, best_move)
         return v
 
-    def eval_state(self, state):
-        result = state.state_result()
+    # Negamax form, scores are from the view of the player on turn
+    # (color is 1 for light and -1 for dark):
+    def pvs(self, state, alpha, beta, depth, color):
+        self.nodes += 1
+        if self.nodes >= self.timer.next_check:
+            self.timer.check(self.nodes)
+        stats = self.stats
+        # Line is cleared before any return, parent would otherwise take
+        # the one left here by a sibling:
+        self.pv_lines[depth] = []
+        # Leaves are probed by eval_state or quiescence:
+        if self.tablebase is not None and 0 < depth < self.cur_max_depth:
+            score = self.probe_tablebase(state)
+            if score is not None:
+                return color * score
+        if depth >= self.cur_max_depth:
+            if stats is not None:
+                stats.leaves += 1
+            if self.use_quiescence:
+                self.quiescence_nodes_left = self.quiescence_budget
+                return self.quiescence(state, alpha, beta, color)
+            return color * self.eval_state(state)
+
+        # Table keeps scores from light's view, so bounds swap for dark:
+        remaining = self.cur_max_depth - depth
+        entry = self.tt.probe(state.hash_key)
+        hash_move = None
+        if stats is not None:
+            stats.tt_probes += 1
+            stats.tt_hits += entry is not None
+        if entry is not None:
+            _, e_depth, e_flag, e_score, hash_move = entry
+            if e_depth >= remaining and depth > 0:
+                e_score *= color
+                if color < 0 and e_flag != EXACT:
+                    e_flag = LOWER_BOUND if e_flag == UPPER_BOUND else UPPER_BOUND
+                if e_flag == LOWER_BOUND and e_score > alpha:
+                    alpha = e_score
+                elif e_flag == UPPER_BOUND and e_score < beta:
+                    beta = e_score
+                if e_flag == EXACT or alpha >= beta:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
+                    return e_score
+
+        moves = state.get_all_turn_moves()
+        result = state.state_result(moves)
+        if result != StateResult.PLAYING:
+            return color * self.eval_result(result)
+        if depth == 0 and self.root_moves is not None:
+            moves = [move for move in moves if move in self.root_moves]
+        if stats is not None:
+            stats.expanded += 1
+            stats.children += len(moves)
+
+        if depth == 0 and self.best_move is not None:
+            hash_move = self.best_move
+        moves = self.orderer.order(moves, depth, hash_move)
+
+        org_alpha = alpha
+        v = -math.inf
+        best_move = None
+        for i, move in enumerate(moves):
+            state.do_move(move)
+            if i == 0:
+                new_v = -self.pvs(state, -beta, -alpha, depth + 1, -color)
+            else:
+                # Other moves are expected to be worse, which is cheaper
+                # to prove with a null window, search again if they aren't:
+                new_v = -self.pvs(
+                    state, -alpha - NULL_WINDOW, -alpha, depth + 1, -color
+                )
+                if alpha < new_v < beta:
+                    new_v = -self.pvs(state, -beta, -alpha, depth + 1, -color)
+            state.undo_move(move)
+
+            if new_v > v or best_move is None:
+                v = new_v
+                best_move = move
+                self.pv_lines[depth] = [move] + self.pv_lines[depth + 1]
+                if depth == 0:
+                    self.cur_best_move = move
+                    if v > org_alpha:
+                        self.partial_best_move = move
+                        self.partial_pv = self.pv_lines[0]
+            if v > alpha:
+                alpha = v
+            if alpha >= beta:
+                self.orderer.record_cutoff(move, depth, remaining)
+                if stats is not None:
+                    stats.cutoffs += 1
+                    stats.first_move_cutoffs += i == 0
+                break
+
+        if v <= org_alpha:
+            flag = UPPER_BOUND if color > 0 else LOWER_BOUND
+        elif v >= beta:
+            flag = LOWER_BOUND if color > 0 else UPPER_BOUND
+        else:
+            flag = EXACT
+        if depth > 0 or self.root_moves is None:
+            self.tt.store(state.hash_key, remaining, flag, color * v, best_move)
+        return v
+
+    # Negamax over captures only, so that leaves are never scored in the
+    # middle of an exchange:
+    # Clock isn't checked here, each leaf visits at most quiescence_budget
+    # nodes before the search gets back to the checked ones:
+    def quiescence(self, state, alpha, beta, color):
+        self.quiescence_nodes_left -= 1
+        if self.stats is not None:
+            self.stats.quiescence_nodes += 1
+        moves = state.get_all_turn_moves()
+        result = state.state_result(moves)
+        if result != StateResult.PLAYING:
+            return color * self.eval_result(result)
+        if self.tablebase is not None:
+            score = self.probe_tablebase(state)
+            if score is not None:
+                return color * score
+
+        # Captures aren't forced, so side on turn can always stand pat.
+        # Tactics are searched here, evaluation can skip guessing them:
+        v = color * self.static_eval(state, tactical=False)
+        if v >= beta or self.quiescence_nodes_left <= 0:
+            return v
+        if v > alpha:
+            alpha = v
+
+        captures = [move for move in moves if move.eaten]
+        for move in self.orderer.order(captures, 0):
+            state.do_move(move)
+            new_v = -self.quiescence(state, -beta, -alpha, -color)
+            state.undo_move(move)
+            if new_v > v:
+                v = new_v
+                if v > alpha:
+                    alpha = v
+                if alpha >= beta:
+                    break
+        return v
+
+    def eval_children(self, state, moves):
+        # Scores of all positions after given moves, the ones that aren't
+        # over are gathered and evaluated in one batch:
+        scores = [0] * len(moves)
+        positions = []
+        indices = []
+        # Children scored without evaluation, finished games and the ones
+        # found in tablebase:
+        finished = 0
+        for i, move in enumerate(moves):
+            state.do_move(move)
+            self.nodes += 1
+            result = state.state_result()
+            score = None
+            if result != StateResult.PLAYING:
+                score = self.eval_result(result)
+            elif self.tablebase is not None:
+                score = self.probe_tablebase(state)
+            if score is not None:
+                scores[i] = score
+                finished += 1
+            elif state.evaluation is not None:
+                scores[i] = state.evaluation.score()
+            else:
+                positions.append(state.bitboards())
+                indices.append(i)
+            state.undo_move(move)
+
+        if self.stats is not None:
+            self.stats.leaves += len(moves)
+            self.stats.evaluations += len(moves) - finished
+        if positions:
+            for i, score in zip(indices, self.batch_evaluator(positions)):
+                scores[i] = score
+        return scores
+
+    def eval_state(self, state, moves=None):
+        result = state.state_result(moves)
+        if result != StateResult.PLAYING:
+            return self.eval_result(result)
+        if self.tablebase is not None:
+            score = self.probe_tablebase(state)
+            if score is not None:
+                return score
+        return self.static_eval(state)
+
+    def probe_tablebase(self, state):
+        # Score from light's view, None when position isn't in tablebase:
+        if state.total_lights + state.total_darks > self.tablebase.max_pieces:
+            return None
+        score = self.tablebase.score(state)
+        if score is not None and self.stats is not None:
+            self.stats.tablebase_hits += 1
+        return score
+
+    def static_eval(self, state, tactical=True):
+        if self.stats is not None:
+            self.stats.evaluations += 1
+        if state.evaluation is not None:
+            return state.evaluation.score(tactical)
+        if self.use_fast_eval:
+            return evaluate_bitboards(*state.bitboards(), tactical)
+        return self.heuristic(state, tactical)
+
+    def eval_result(self, result):
         if result == StateResult.LIGHT_WON:
             return math.inf
         elif result == StateResult.DARK_WON:
             return -math.inf
-        elif result == StateResult.DRAW:
-            return 0
-        return self.heuristic(state)
+        return 0
 
-    def evaluate_piece(self, state, piece, row, col, stats, is_light=True):
+    def evaluate_piece(self, state, piece, tile, stats, is_light=True, tactical=True):
         if piece.is_base():
             stats[0] += 1
         else:
             stats[1] += 1
 
+        row = TILE_ROW[tile]
         if (is_light and row == ROWS - 1) or (not is_light and row == 0):
             stats[2] += 1
             # Back pieces are protected:
             stats[6] += 1
             return
 
-        self.evaluate_positioning(row, col, stats)
-        self.evaluate_if_can_be_taken(state, piece, row, col, stats, is_light)
-        self.evaluate_protection(state, piece, row, col, stats, is_light)
-        self.evaluate_attack(state, piece, row, col, stats, is_light)
+        self.evaluate_positioning(row, TILE_COL[tile], stats)
+        self.evaluate_protection(state, piece, tile, stats, is_light)
+        if tactical:
+            self.evaluate_if_can_be_taken(state, piece, tile, stats, is_light)
+            self.evaluate_attack(state, piece, tile, stats, is_light)
 
     def evaluate_positioning(self, row, col, stats):
         # Check if the piece is in the middle:
@@ -146,16 +729,20 @@ class Computer(object):
             else:
                 stats[4] += 1
 
-    def evaluate_if_can_be_taken(self, state, piece, row, col, stats, is_light):
+    def evaluate_if_can_be_taken(self, state, piece, tile, stats, is_light):
         # Get all nearby pieces and check for direct eating rules,
-        # here won't be calculated jumping eating moves:
+        # here won't be calculated jumping eating moves. Pieces on the
+        # board edges can't be jumped over:
+        neighbours = TILE_NEIGHBOUR[tile]
+        if -1 in neighbours:
+            return
 
-        if is_light and row > 0 and 0 < col < 7:
-            ul = state.at(row - 1, col - 1)
-            ur = state.at(row - 1, col + 1)
-            dl = state.at(row + 1, col - 1)
-            dr = state.at(row + 1, col + 1)
+        ul = state.atTile(neighbours[UP_LEFT])
+        ur = state.atTile(neighbours[UP_RIGHT])
+        dl = state.atTile(neighbours[DOWN_LEFT])
+        dr = state.atTile(neighbours[DOWN_RIGHT])
 
+        if is_light:
             if (
                 (ul.enemy(piece) and dr.empty())
                 or (ur.enemy(piece) and dl.empty())
@@ -164,57 +751,45 @@ class Computer(object):
             ):
                 stats[5] += 1.5 if piece.is_queen() else 1
 
-        elif not is_light and row < ROWS - 1 and 0 < col < 7:
-            ul = state.at(row - 1, col - 1)
-            ur = state.at(row - 1, col + 1)
-            dl = state.at(row + 1, col - 1)
-            dr = state.at(row + 1, col + 1)
-            if (
-                (dl.enemy(piece) and ur.empty())
-                or (dr.enemy(piece) and ul.empty())
-                or (ul.enemy(piece) and ul.is_queen() and dr.empty())
-                or (ur.enemy(piece) and ur.is_queen() and dl.empty())
-            ):
-                stats[5] += 1.5 if piece.is_queen() else 1
+        elif (
+            (dl.enemy(piece) and ur.empty())
+            or (dr.enemy(piece) and ul.empty())
+            or (ul.enemy(piece) and ul.is_queen() and dr.empty())
+            or (ur.enemy(piece) and ur.is_queen() and dl.empty())
+        ):
+            stats[5] += 1.5 if piece.is_queen() else 1
+
+    def evaluate_protection(self, state, piece, tile, stats, is_light):
+        neighbours = TILE_NEIGHBOUR[tile]
+        if is_light:
+            bl, br = neighbours[DOWN_LEFT], neighbours[DOWN_RIGHT]
+        else:
+            bl, br = neighbours[UP_LEFT], neighbours[UP_RIGHT]
 
-    def evaluate_protection(self, state, piece, row, col, stats, is_light):
-        bl = None
-        br = None
-        if is_light and row < ROWS - 1:
-            if col > 0:
-                bl = state.at(row + 1, col - 1)
-            if col < COLS - 1:
-                br = state.at(row + 1, col + 1)
-        elif not is_light and row > 0:
-            if col > 0:
-                bl = state.at(row - 1, col - 1)
-            if col < COLS - 1:
-                br = state.at(row - 1, col + 1)
-
-        if bl and br:
+        if bl != -1 and br != -1:
+            bl = state.atTile(bl)
+            br = state.atTile(br)
             if (bl.friend(piece) or (bl.enemy(piece) and bl.is_base())) and (
                 br.friend(piece) or (br.enemy(piece) and br.is_base())
             ):
                 stats[6] += 2 if piece.is_queen() else 1
 
-    def evaluate_attack(self, state, piece, row, col, stats, is_light):
-        if piece.is_queen():
-            directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-        else:
-            directions = [(-1, -1), (-1, 1)] if is_light else [(1, -1), (1, 1)]
+    def evaluate_attack(self, state, piece, tile, stats, is_light):
+        neighbours = TILE_NEIGHBOUR[tile]
+        jumps = TILE_JUMP[tile]
+        color = Color.LIGHT if is_light else Color.DARK
 
-        for dr, dc in directions:
-            rm, cm = row + dr, col + dc
-            re, ce = row + 2 * dr, col + 2 * dc
-
-            if 0 <= rm < ROWS and 0 <= cm < COLS and 0 <= re < ROWS and 0 <= ce < COLS:
-                mid = state.at(rm, cm)
-                end = state.at(re, ce)
+        for dir in MOVE_DIRECTIONS[color, piece.type]:
+            if jumps[dir] != -1:
+                mid = state.atTile(neighbours[dir])
+                end = state.atTile(jumps[dir])
 
                 if mid.enemy(piece) and end.empty():
                     stats[7] += 1.5 if mid.is_queen() else 1
 
-    def heuristic(self, state):
+    # Without tactical terms, pieces that can be taken and attacks aren't
+    # counted, which is meant for quiescence search that plays them out:
+    def heuristic(self, state, tactical=True):
         light_stats = [0] * 8
         dark_stats = [0] * 8
 
@@ -223,13 +798,10 @@ class Computer(object):
             if piece.empty():
                 continue
 
-            row = tile // ROWS
-            col = tile % COLS
-
             if piece.is_light():
-                self.evaluate_piece(state, piece, row, col, light_stats, is_light=True)
+                self.evaluate_piece(state, piece, tile, light_stats, True, tactical)
             else:
-                self.evaluate_piece(state, piece, row, col, dark_stats, is_light=False)
+                self.evaluate_piece(state, piece, tile, dark_stats, False, tactical)
 
         weights = [5, 7.5, 4, 2.5, 0.5, -3, 2, 2.5]
         score = 0
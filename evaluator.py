@@ -0,0 +1,351 @@
+from array import array
+
+from bitboard import (
+    ALL_DIRECTIONS,
+    DARK_FORWARD,
+    DOWN_LEFT,
+    DOWN_RIGHT,
+    LIGHT_FORWARD,
+    NEIGHBOUR,
+    OPPOSITE,
+    SQ_TO_TILE,
+    SQUARES,
+    TILE_TO_SQ,
+    UP_LEFT,
+    UP_RIGHT,
+    shift,
+    squares_of,
+)
+from utility import COLS, ROWS
+
+# Same weights as Computer.heuristic, for (base pieces, queens, back row,
+# middle box, rest of middle rows, can be taken, protected, attacks):
+WEIGHTS = [5, 7.5, 4, 2.5, 0.5, -3, 2, 2.5]
+
+
+def mask_of(condition):
+    mask = 0
+    for sq in range(SQUARES):
+        row, col = divmod(SQ_TO_TILE[sq], COLS)
+        if condition(row, col):
+            mask |= 1 << sq
+    return mask
+
+
+TOP_ROW = mask_of(lambda row, col: row == 0)
+BOTTOM_ROW = mask_of(lambda row, col: row == ROWS - 1)
+INNER_COLS = mask_of(lambda row, col: 0 < col < COLS - 1)
+MIDDLE_BOX = mask_of(lambda row, col: row in (3, 4) and 2 <= col <= 5)
+MIDDLE_SIDES = mask_of(lambda row, col: row in (3, 4) and not 2 <= col <= 5)
+
+
+def neighbour_in(bb, dir):
+    # Squares whose neighbour in given direction is in bb:
+    return shift(bb, OPPOSITE[dir])
+
+
+def jump_in(bb, dir):
+    # Squares whose square two steps away in given direction is in bb:
+    back = OPPOSITE[dir]
+    return shift(shift(bb, back), back)
+
+
+def side_features(own, opp, queens, empty, back_row, forward, backward, tactical):
+    # Counts the eight heuristic features of one side at once for all of
+    # its pieces, mirroring Computer.evaluate_piece:
+    stats = [0] * 8
+    own_queens = own & queens
+    opp_queens = opp & queens
+    stats[0] = (own & ~queens).bit_count()
+    stats[1] = own_queens.bit_count()
+
+    # Pieces on their own back row only count as back and protected:
+    back = own & back_row
+    rest = own & ~back
+    stats[2] = back.bit_count()
+    stats[3] = (rest & MIDDLE_BOX).bit_count()
+    stats[4] = (rest & MIDDLE_SIDES).bit_count()
+
+    # Both back diagonal tiles hold a friend or an enemy base piece:
+    guard = own | (opp & ~queens)
+    protected = (
+        rest & neighbour_in(guard, backward[0]) & neighbour_in(guard, backward[1])
+    )
+    stats[6] = (
+        back.bit_count() + protected.bit_count() + (protected & queens).bit_count()
+    )
+
+    if not tactical:
+        return stats
+
+    # Enemy in front with free tile behind, or enemy queen behind with
+    # free tile in front, both only for pieces off the board edges:
+    front_left, front_right = forward
+    back_left, back_right = backward
+    taken = (
+        (neighbour_in(opp, front_left) & neighbour_in(empty, back_right))
+        | (neighbour_in(opp, front_right) & neighbour_in(empty, back_left))
+        | (neighbour_in(opp_queens, back_left) & neighbour_in(empty, front_right))
+        | (neighbour_in(opp_queens, back_right) & neighbour_in(empty, front_left))
+    )
+    taken &= rest & INNER_COLS & ~(TOP_ROW | BOTTOM_ROW)
+    stats[5] = taken.bit_count() + 0.5 * (taken & queens).bit_count()
+
+    attacks = 0
+    for dir in forward + backward:
+        movers = rest if dir in forward else rest & queens
+        landing = jump_in(empty, dir)
+        attacks += (movers & neighbour_in(opp & ~queens, dir) & landing).bit_count()
+        attacks += 1.5 * (movers & neighbour_in(opp_queens, dir) & landing).bit_count()
+    stats[7] = attacks
+    return stats
+
+
+def evaluate_bitboards(light, dark, queens, tactical=True):
+    empty = ~(light | dark) & ((1 << SQUARES) - 1)
+    light_stats = side_features(
+        light,
+        dark,
+        queens,
+        empty,
+        BOTTOM_ROW,
+        (UP_LEFT, UP_RIGHT),
+        (DOWN_LEFT, DOWN_RIGHT),
+        tactical,
+    )
+    dark_stats = side_features(
+        dark,
+        light,
+        queens,
+        empty,
+        TOP_ROW,
+        (DOWN_LEFT, DOWN_RIGHT),
+        (UP_LEFT, UP_RIGHT),
+        tactical,
+    )
+
+    score = 0
+    for i in range(len(WEIGHTS)):
+        score += WEIGHTS[i] * (light_stats[i] - dark_stats[i])
+    return score
+
+
+def evaluate_batch(positions, tactical=True):
+    # Scores of many (light, dark, queens) positions at once:
+    return array("d", (evaluate_bitboards(*bbs, tactical) for bbs in positions))
+
+
+# Weighted worth of a piece that depends only on its own square (material,
+# back row, middle box and sides), PIECE_SQUARE[is_light][is_queen][sq]:
+PIECE_SQUARE = [[[0] * SQUARES for _ in range(2)] for _ in range(2)]
+for _light in (0, 1):
+    for _queen in (0, 1):
+        for _sq in range(SQUARES):
+            _bit = 1 << _sq
+            _value = WEIGHTS[1] if _queen else WEIGHTS[0]
+            if _bit & (BOTTOM_ROW if _light else TOP_ROW):
+                _value += WEIGHTS[2] + WEIGHTS[6]
+            elif _bit & MIDDLE_BOX:
+                _value += WEIGHTS[3]
+            elif _bit & MIDDLE_SIDES:
+                _value += WEIGHTS[4]
+            PIECE_SQUARE[_light][_queen][_sq] = _value if _light else -_value
+
+# Local terms of a piece look at its neighbours and the squares two steps
+# away, so a change on one square affects only pieces in AFFECTED[sq]:
+AFFECTED = [0] * SQUARES
+for _sq in range(SQUARES):
+    AFFECTED[_sq] = 1 << _sq
+    for _dir in ALL_DIRECTIONS:
+        _near = NEIGHBOUR[_sq][_dir]
+        if _near != -1:
+            AFFECTED[_sq] |= 1 << _near
+            if NEIGHBOUR[_near][_dir] != -1:
+                AFFECTED[_sq] |= 1 << NEIGHBOUR[_near][_dir]
+
+
+class IncrementalEvaluation(object):
+    # Keeps heuristic score up to date while moves are made and unmade:
+    # square only terms are added and removed as pieces move, protection
+    # and tactical terms are recomputed only for pieces near the touched
+    # squares. States call do_move/undo_move on it from their own.
+    def __init__(self, light, dark, queens):
+        self.light = light
+        self.dark = dark
+        self.queens = queens
+        self.square_score = 0
+        self.protection = [0] * SQUARES
+        self.tactics = [0] * SQUARES
+        self.protection_score = 0
+        self.tactics_score = 0
+        self.history = []
+
+        for sq in squares_of(light | dark):
+            bit = 1 << sq
+            self.square_score += PIECE_SQUARE[bool(light & bit)][bool(queens & bit)][sq]
+        self.update_squares(light | dark, [])
+
+    def score(self, tactical=True):
+        if tactical:
+            return self.square_score + self.protection_score + self.tactics_score
+        return self.square_score + self.protection_score
+
+    def local_terms(self, sq):
+        bit = 1 << sq
+        if self.light & bit:
+            own, opp, sign = self.light, self.dark, 1
+            forward, back_row = LIGHT_FORWARD, BOTTOM_ROW
+        else:
+            own, opp, sign = self.dark, self.light, -1
+            forward, back_row = DARK_FORWARD, TOP_ROW
+        if bit & back_row:
+            return 0, 0
+
+        queens = self.queens
+        is_queen = queens & bit
+        empty = ~(own | opp)
+        guard = own | (opp & ~queens)
+        front_left, front_right = forward
+        back_right, back_left = OPPOSITE[front_left], OPPOSITE[front_right]
+        near = NEIGHBOUR[sq]
+
+        protection = 0
+        bl, br = near[back_left], near[back_right]
+        if bl != -1 and br != -1 and guard >> bl & 1 and guard >> br & 1:
+            protection = WEIGHTS[6] * (2 if is_queen else 1)
+
+        tactics = 0
+        if bit & INNER_COLS and not bit & (TOP_ROW | BOTTOM_ROW):
+            fl, fr = near[front_left], near[front_right]
+            if (
+                (opp >> fl & 1 and empty >> br & 1)
+                or (opp >> fr & 1 and empty >> bl & 1)
+                or ((opp & queens) >> bl & 1 and empty >> fr & 1)
+                or ((opp & queens) >> br & 1 and empty >> fl & 1)
+            ):
+                tactics += WEIGHTS[5] * (1.5 if is_queen else 1)
+
+        for dir in ALL_DIRECTIONS if is_queen else forward:
+            mid = near[dir]
+            if mid == -1 or not opp >> mid & 1:
+                continue
+            land = NEIGHBOUR[mid][dir]
+            if land != -1 and empty >> land & 1:
+                tactics += WEIGHTS[7] * (1.5 if queens >> mid & 1 else 1)
+        return sign * protection, sign * tactics
+
+    def update_squares(self, squares, changed):
+        occupied = self.light | self.dark
+        for sq in squares_of(squares):
+            if occupied & (1 << sq):
+                protection, tactics = self.local_terms(sq)
+            else:
+                protection, tactics = 0, 0
+            changed.append((sq, self.protection[sq], self.tactics[sq]))
+            self.protection_score += protection - self.protection[sq]
+            self.tactics_score += tactics - self.tactics[sq]
+            self.protection[sq] = protection
+            self.tactics[sq] = tactics
+
+    def do_move(self, move):
+        start = TILE_TO_SQ[move.start]
+        dest = TILE_TO_SQ[move.dest]
+        start_bit, dest_bit = 1 << start, 1 << dest
+        is_light = bool(self.light & start_bit)
+        was_queen = bool(self.queens & start_bit)
+        changed = []
+        self.history.append(
+            (
+                self.light,
+                self.dark,
+                self.queens,
+                self.square_score,
+                self.protection_score,
+                self.tactics_score,
+                changed,
+            )
+        )
+
+        # Square terms of the moved piece and all eaten ones:
+        square_score = self.square_score
+        square_score -= PIECE_SQUARE[is_light][was_queen][start]
+        square_score += PIECE_SQUARE[is_light][was_queen or move.promoted][dest]
+        touched = AFFECTED[start] | AFFECTED[dest]
+        if is_light:
+            self.light ^= start_bit | dest_bit
+        else:
+            self.dark ^= start_bit | dest_bit
+        if was_queen:
+            self.queens ^= start_bit | dest_bit
+        elif move.promoted:
+            self.queens |= dest_bit
+
+        for info in move.eaten:
+            sq = TILE_TO_SQ[info.tile]
+            bit = 1 << sq
+            square_score -= PIECE_SQUARE[not is_light][bool(self.queens & bit)][sq]
+            self.light &= ~bit
+            self.dark &= ~bit
+            self.queens &= ~bit
+            touched |= AFFECTED[sq]
+        self.square_score = square_score
+
+        self.update_squares(touched, changed)
+
+    def undo_move(self):
+        (
+            self.light,
+            self.dark,
+            self.queens,
+            self.square_score,
+            self.protection_score,
+            self.tactics_score,
+            changed,
+        ) = self.history.pop()
+        for sq, protection, tactics in changed:
+            self.protection[sq] = protection
+            self.tactics[sq] = tactics
+
+
+def check_parity(games=200, seed=0):
+    # Plays random games and compares every position's score with the
+    # tile by tile Computer.heuristic:
+    import random
+
+    from computer import Computer
+    from state import State
+
+    rng = random.Random(seed)
+    ai = Computer(1, 1)
+    positions = 0
+    for _ in range(games):
+        state = State()
+        state.evaluation = IncrementalEvaluation(*state.bitboards())
+        played = []
+        moves = state.get_all_turn_moves()
+        while moves:
+            for tactical in (True, False):
+                expected = ai.heuristic(state, tactical)
+                for actual in (
+                    evaluate_bitboards(*state.bitboards(), tactical),
+                    state.evaluation.score(tactical),
+                ):
+                    if expected != actual:
+                        raise AssertionError(
+                            f"Scores differ ({expected} != {actual}):\n{state}"
+                        )
+            positions += 1
+            played.append(rng.choice(moves))
+            state.do_move(played[-1])
+            moves = state.get_all_turn_moves()
+
+        # Unmaking the moves has to bring back the same scores:
+        while played:
+            state.undo_move(played.pop())
+            if ai.heuristic(state) != state.evaluation.score():
+                raise AssertionError(f"Scores differ after undo:\n{state}")
+    return positions
+
+
+if __name__ == "__main__":
+    print(f"Same scores on {check_parity()} positions")
@@ -2,21 +2,45 @@ from piece import Color, Type
 from utility import COLS, ROWS
 
 
+# Both EatenInfo and Move are immutable and interned: creating one with the
+# same values again returns the already existing object, so generating
+# moves allocates nothing new for positions seen before.
 class EatenInfo:
-    def __init__(self, tile: int, p_type: Type, p_color: Color):
-        self.tile: int = tile
-        self.p_type: Type = p_type
-        self.p_color: Color = p_color
+    __slots__ = ("tile", "p_type", "p_color", "_hash")
+    _interned = {}
+
+    tile: int
+    p_type: Type
+    p_color: Color
+
+    def __new__(cls, tile: int, p_type: Type, p_color: Color):
+        key = (tile, p_type, p_color)
+        info = cls._interned.get(key)
+        if info is None:
+            info = object.__new__(cls)
+            object.__setattr__(info, "tile", tile)
+            object.__setattr__(info, "p_type", p_type)
+            object.__setattr__(info, "p_color", p_color)
+            object.__setattr__(info, "_hash", hash(key))
+            cls._interned[key] = info
+        return info
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (EatenInfo, (self.tile, self.p_type, self.p_color))
 
     def __eq__(self, other):
-        return (
-            self.tile == other.tile
+        return self is other or (
+            isinstance(other, EatenInfo)
+            and self.tile == other.tile
             and self.p_type == other.p_type
             and self.p_color == other.p_color
         )
 
     def __hash__(self):
-        return hash((self.tile, self.p_type, self.p_color))
+        return self._hash
 
     def __str__(self):
         row = self.tile // ROWS
@@ -28,35 +52,84 @@ class EatenInfo:
 
 
 class Move:
-    def __init__(
-        self,
+    __slots__ = (
+        "start",
+        "dest",
+        "eaten",
+        "promoted",
+        "captured",
+        "captured_squares",
+        "captured_queens",
+        "_hash",
+    )
+    _interned = {}
+
+    start: int
+    dest: int
+    eaten: tuple[EatenInfo]
+    promoted: bool
+    # Masks of eaten tiles (bit per tile), and of eaten squares and eaten
+    # queens in BitboardState numbering (bit per dark square):
+    captured: int
+    captured_squares: int
+    captured_queens: int
+
+    def __new__(
+        cls,
         start: int,
         dest: int,
         eaten: tuple[EatenInfo] = None,
         promoted=False,
     ):
-        self.start = start
-        self.dest = dest
-        self.eaten = eaten if eaten is not None else tuple()
-        self.promoted = promoted
+        # Eaten may be given as None, a list or a tuple, key is built from
+        # the normalised values so that all of them find the same move:
+        eaten = tuple(eaten) if eaten is not None else tuple()
+        promoted = bool(promoted)
+        key = (start, dest, eaten, promoted)
+        move = cls._interned.get(key)
+        if move is not None:
+            return move
+
+        captured = captured_squares = captured_queens = 0
+        for info in eaten:
+            captured |= 1 << info.tile
+            # Only dark tiles are playable, their square is tile // 2:
+            captured_squares |= 1 << (info.tile >> 1)
+            if info.p_type == Type.QUEEN:
+                captured_queens |= 1 << (info.tile >> 1)
+
+        move = object.__new__(cls)
+        for name, value in (
+            ("start", start),
+            ("dest", dest),
+            ("eaten", eaten),
+            ("promoted", promoted),
+            ("captured", captured),
+            ("captured_squares", captured_squares),
+            ("captured_queens", captured_queens),
+            ("_hash", hash(key)),
+        ):
+            object.__setattr__(move, name, value)
+        cls._interned[key] = move
+        return move
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (Move, (self.start, self.dest, self.eaten, self.promoted))
 
     def __eq__(self, other):
-        return (
-            self.start == other.start
+        return self is other or (
+            isinstance(other, Move)
+            and self.start == other.start
             and self.dest == other.dest
             and self.eaten == other.eaten
             and self.promoted == other.promoted
         )
 
     def __hash__(self):
-        return hash(
-            (
-                self.start,
-                self.dest,
-                self.eaten,
-                self.promoted,
-            )
-        )
+        return self._hash
 
     def __str__(self):
         s_row = self.start // ROWS
@@ -0,0 +1,85 @@
+from piece import Type
+from utility import COLS, ROWS
+
+# Ordering scores, every group comes strictly before the next one
+# (hash move is put in front of all of them):
+CAPTURE_SCORE = 1 << 24
+PROMOTION_SCORE = 1 << 23
+KILLER_SCORE = 1 << 22
+
+# Worth of eaten pieces when comparing captures:
+EATEN_VALUES = {Type.BASE: 2, Type.QUEEN: 3}
+
+# Keeping history scores below killers:
+MAX_HISTORY = KILLER_SCORE - 1
+
+
+class MoveOrderer(object):
+    def __init__(self, killers_per_ply=2):
+        self.killers_per_ply = killers_per_ply
+        self.killers = {}
+        self.history = [0] * (ROWS * COLS * ROWS * COLS)
+
+    def clear(self):
+        self.killers = {}
+        self.history = [0] * (ROWS * COLS * ROWS * COLS)
+
+    def age(self):
+        # Called between searches, killers belong to plies of the last one,
+        # which are shifted by the moves played since, history only fades:
+        self.killers = {}
+        self.history = [h // 2 for h in self.history]
+
+    def score(self, move, killers):
+        score = 0
+        if move.eaten:
+            score += CAPTURE_SCORE
+            for info in move.eaten:
+                score += EATEN_VALUES[info.p_type]
+        if move.promoted:
+            score += PROMOTION_SCORE
+        if score == 0:
+            # Quiet moves are ordered by killers first, then history:
+            if move in killers:
+                score = KILLER_SCORE - killers.index(move)
+            else:
+                score = self.history[move.start * ROWS * COLS + move.dest]
+        return score
+
+    def order(self, moves, ply, hash_move=None):
+        killers = self.killers.get(ply, [])
+        moves.sort(key=lambda move: self.score(move, killers), reverse=True)
+
+        # Best move from earlier search always goes first:
+        if hash_move is not None and hash_move in moves:
+            moves.remove(hash_move)
+            moves.insert(0, hash_move)
+        return moves
+
+    def record_cutoff(self, move, ply, depth):
+        # Only quiet moves are remembered, captures are ordered anyway:
+        if move.eaten or move.promoted:
+            return
+
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[self.killers_per_ply :]
+
+        index = move.start * ROWS * COLS + move.dest
+        self.history[index] += depth * depth
+        if self.history[index] > MAX_HISTORY:
+            # Halving everything keeps relative order of history scores:
+            self.history = [h // 2 for h in self.history]
+
+
+class NoOrdering(MoveOrderer):
+    # Moves are searched in generated order (apart from the hash move):
+    def order(self, moves, ply, hash_move=None):
+        if hash_move is not None and hash_move in moves:
+            moves.remove(hash_move)
+            moves.insert(0, hash_move)
+        return moves
+
+    def record_cutoff(self, move, ply, depth):
+        pass
@@ -0,0 +1,169 @@
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from computer import Computer
+from piece import Color
+from state import State
+
+# Time kept aside for sending work to processes and collecting results:
+SCHEDULING_MARGIN_SEC = 0.05
+
+# How often the waiting main process looks for a cancel to pass on:
+CANCEL_POLL_SEC = 0.01
+
+# Each worker process keeps its own Computer between searches, all of
+# them stop once the shared cancel event is set:
+_worker_ai = None
+_worker_cancel = None
+
+
+def init_worker(max_depth, options, cancel_event):
+    global _worker_ai, _worker_cancel
+    _worker_ai = Computer(math.inf, max_depth, **options)
+    _worker_cancel = cancel_event
+    # Only the main process reports progress:
+    sys.stdout = open(os.devnull, "w")
+
+
+def search_root_moves(
+    position, root_moves, time_limit_sec, use_ab, use_pvs, clear_cache
+):
+    # Position comes packed by State.to_bytes, much cheaper to send than
+    # the pickled tiles:
+    state = State.from_bytes(position)
+    _worker_ai.time_limit_sec = time_limit_sec
+    _worker_ai.root_moves = root_moves
+    _worker_ai.iterative_deepening(
+        state, use_ab, use_pvs, clear_cache=clear_cache, cancel_event=_worker_cancel
+    )
+    return (
+        _worker_ai.completed_depths,
+        _worker_ai.nodes,
+        _worker_ai.stats,
+        _worker_ai.principal_variation,
+    )
+
+
+class ParallelComputer(Computer):
+    # Stands in for Computer, get_next_best_move is searched by worker
+    # processes and can be cancelled the same way. Pondering runs in this
+    # process alone, as ponder and ponderhit are left as in Computer:
+    def __init__(self, time_limit_sec, max_depth, workers=4, **options):
+        super().__init__(time_limit_sec, max_depth, **options)
+        self.workers = workers
+        # Workers are told to clear their tables on next search after reset:
+        self.clear_workers = False
+        self.workers_cancel = multiprocessing.Event()
+        # Processes are started once and stay warm between moves:
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(max_depth, options, self.workers_cancel),
+        )
+        # Starting them right away keeps it out of the first move's time:
+        for future in [self.executor.submit(os.getpid) for _ in range(workers)]:
+            future.result()
+
+    def shutdown(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    def reset(self):
+        super().reset()
+        self.clear_workers = True
+
+    def get_next_best_move(
+        self, state, use_ab=True, use_pvs=False, clear_cache=False, cancel_event=None
+    ):
+        if self.book is not None:
+            move = self.book.choose(state)
+            if move is not None:
+                print(f"Book move is {move}")
+                return self.skip_search(move)
+
+        print("Thinking...")
+        start = time.perf_counter()
+        # Our timer only carries the cancel, workers keep their own time:
+        self.timer.start(self.time_limit_sec, cancel_event=cancel_event)
+
+        moves = state.get_all_turn_moves()
+        if len(moves) <= 1:
+            return self.skip_search(moves[0] if moves else None)
+
+        # Root moves are dealt out in order, so that every worker gets its
+        # share of the promising ones:
+        moves = self.orderer.order(moves, 0)
+        chunks = [moves[i :: self.workers] for i in range(self.workers)]
+        chunks = [chunk for chunk in chunks if chunk]
+
+        clear_cache = clear_cache or self.clear_workers
+        self.clear_workers = False
+        self.workers_cancel.clear()
+        time_left = self.time_limit_sec - SCHEDULING_MARGIN_SEC
+        position = state.to_bytes()
+        futures = [
+            self.executor.submit(
+                search_root_moves,
+                position,
+                chunk,
+                time_left - (time.perf_counter() - start),
+                use_ab,
+                use_pvs,
+                clear_cache,
+            )
+            for chunk in chunks
+        ]
+        # Cancel of this search is passed on to the workers:
+        pending = futures
+        while pending:
+            _, pending = wait(pending, CANCEL_POLL_SEC)
+            if self.timer.cancelled:
+                self.workers_cancel.set()
+        results = [future.result() for future in futures]
+
+        self.nodes = sum(nodes for _, nodes, _, _ in results)
+        if self.stats is not None:
+            self.stats.clear()
+            for _, _, stats, _ in results:
+                self.stats.add(stats)
+        best_move = self.merge_results(state, moves, results)
+        print(f"Searched {self.nodes} nodes on {len(chunks)} processes")
+        print(f"Best move is {best_move}")
+        if self.stats is not None:
+            print(self.stats)
+        return best_move
+
+    def merge_results(self, state, moves, results):
+        # Scores can only be compared at the same depth, so completed_depths
+        # holds the best of all workers at every depth finished by all of
+        # them. Equal scores go to the move that was ordered first, which
+        # keeps the choice independent of the order in which workers finish.
+        # A worker that finished no depth leaves its moves unscored, none
+        # can then be compared and the first ordered move is played:
+        self.cur_max_depth = min(len(depths) for depths, _, _, _ in results)
+        sign = 1 if state.turn_color == Color.LIGHT else -1
+        self.completed_depths = []
+        for d in range(self.cur_max_depth):
+            best_key = None
+            for depths, _, _, _ in results:
+                _, score, move, elapsed = depths[d]
+                key = (sign * score, -moves.index(move))
+                if best_key is None or key > best_key:
+                    best_key = key
+                    best = (d + 1, score, move, elapsed)
+            self.completed_depths.append(best)
+
+        self.best_move = moves[0]
+        self.principal_variation = [moves[0]]
+        if self.completed_depths:
+            self.best_move = self.completed_depths[-1][2]
+            self.principal_variation = [self.best_move]
+            # Worker's line is kept when its deepest depth chose the same move:
+            for _, _, _, line in results:
+                if line and line[0] == self.best_move:
+                    self.principal_variation = line
+        print(f"We reached depth {self.cur_max_depth}")
+        return self.best_move
@@ -0,0 +1,103 @@
+import argparse
+import sys
+import time
+
+from benchmark import POSITIONS
+from bitboard import BitboardState
+from piece import Color
+from state import State
+
+# Leaf counts of benchmark positions for depths 1, 2, ...:
+REFERENCE = {
+    "opening": [7, 49, 379, 2872, 23582, 190647, 1607272],
+    "early middlegame": [7, 64, 492, 4616, 37512, 353765, 2928086],
+    "middlegame": [7, 52, 415, 3367, 28714, 236564, 2085457],
+    "open middlegame": [11, 111, 1182, 12273, 128436, 1296790, 13244659],
+    "queens endgame": [4, 61, 275, 3981, 18504, 264610, 1291748],
+    "late endgame": [3, 15, 70, 462, 1980, 13938, 68313],
+}
+
+
+def perft(state, depth):
+    # Number of positions reached after exactly depth moves:
+    if depth == 0:
+        return 1
+
+    moves = state.get_all_turn_moves()
+    # Leaves don't have to be played, counting them is enough:
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        state.do_move(move)
+        nodes += perft(state, depth - 1)
+        state.undo_move(move)
+    return nodes
+
+
+def divide(state, depth):
+    # Leaf counts split by root move:
+    counts = []
+    for move in state.get_all_turn_moves():
+        state.do_move(move)
+        counts.append((move, perft(state, depth - 1)))
+        state.undo_move(move)
+    return counts
+
+
+def main():
+    names = [name for name, _, _ in POSITIONS]
+    parser = argparse.ArgumentParser(description="Move generator leaf counts.")
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--position", choices=names, default="opening")
+    parser.add_argument("--board", help="board written the way str(State) prints it")
+    parser.add_argument("--turn", choices=["light", "dark"], default="light")
+    parser.add_argument("--bitboards", action="store_true")
+    parser.add_argument("--divide", action="store_true")
+    parser.add_argument("--all", action="store_true", help="check every position")
+    args = parser.parse_args()
+
+    if args.board is not None:
+        turn_color = Color.LIGHT if args.turn == "light" else Color.DARK
+        positions = [("custom", args.board, turn_color)]
+    elif args.all:
+        positions = POSITIONS
+    else:
+        positions = [p for p in POSITIONS if p[0] == args.position]
+
+    failed = False
+    for name, board, turn_color in positions:
+        state = State.from_string(board, turn_color)
+        if args.bitboards:
+            state = BitboardState.from_state(state)
+        reference = REFERENCE.get(name, [])
+        print(name)
+
+        for depth in range(1, args.depth + 1):
+            start = time.perf_counter()
+            nodes = perft(state, depth)
+            elapsed = time.perf_counter() - start
+
+            check = ""
+            if depth <= len(reference):
+                if nodes == reference[depth - 1]:
+                    check = "ok"
+                else:
+                    check = f"expected {reference[depth - 1]}"
+                    failed = True
+            print(
+                f"  depth {depth:2} {nodes:12} nodes {elapsed:8.3f} s "
+                f"{nodes / max(elapsed, 1e-9):10.0f} n/s  {check}"
+            )
+
+        if args.divide:
+            for move, nodes in divide(state, args.depth):
+                print(f"  {move}: {nodes}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,8 @@ class Type(Enum):
 
 
 class Piece(object):
+    __slots__ = ("type", "color")
+
     def __init__(self, type=Type.EMPTY, color=Color.LIGHT):
         self.type = type
         self.color = color
@@ -58,11 +60,21 @@ class Piece(object):
     def same_color_as(self, other_color: Color):
         return self.color == other_color
 
+    # Eaten pieces keep their old color, so emptiness of both sides
+    # has to be checked before comparing colors:
     def friend(self, piece):
-        return not piece.empty() and self.same_color_as(piece.color)
+        return (
+            not self.empty()
+            and not piece.empty()
+            and self.same_color_as(piece.color)
+        )
 
     def enemy(self, piece):
-        return not piece.empty() and self.is_opposite_color(piece.color)
+        return (
+            not self.empty()
+            and not piece.empty()
+            and self.is_opposite_color(piece.color)
+        )
 
     def promote(self):
         if self.is_queen():
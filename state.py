@@ -1,6 +1,17 @@
+from bitboard import (
+    MOVE_DIRECTIONS,
+    OPPOSITE,
+    POSITION,
+    PROMOTION_TILES,
+    SQ_TO_TILE,
+    SQUARES,
+    TILE_JUMP,
+    TILE_NEIGHBOUR,
+)
 from move import EatenInfo, Move
 from piece import Color, Piece, Type
 from utility import *
+from zobrist import PIECE_KEYS, TURN_KEY, compute_hash
 
 
 class State(object):
@@ -12,6 +23,9 @@ class State(object):
 
         self.tiles = self.initial_state()
         self.turn_color = Color.LIGHT
+        self.hash_key = compute_hash(self)
+        # Optional IncrementalEvaluation kept in sync with moves:
+        self.evaluation = None
 
     def initial_state(self):
         matrix = [Piece(Type.EMPTY) for _ in range(COLS * ROWS)]
@@ -29,12 +43,88 @@ class State(object):
                     continue
         return matrix
 
-    def state_result(self):
+    @classmethod
+    def from_string(cls, text, turn_color=Color.LIGHT):
+        # Reads the board in the same format str(state) prints it:
+        tokens = text.split()
+        assert len(tokens) == ROWS * COLS
+        pieces = {
+            "0": (Type.EMPTY, Color.LIGHT),
+            "1": (Type.BASE, Color.LIGHT),
+            "2": (Type.BASE, Color.DARK),
+            "11": (Type.QUEEN, Color.LIGHT),
+            "22": (Type.QUEEN, Color.DARK),
+        }
+
+        state = cls()
+        state.total_lights = state.light_queens = 0
+        state.total_darks = state.dark_queens = 0
+        for tile, token in enumerate(tokens):
+            type, color = pieces[token]
+            state.tiles[tile] = Piece(type, color)
+            if type == Type.EMPTY:
+                continue
+            if color == Color.LIGHT:
+                state.total_lights += 1
+                state.light_queens += type == Type.QUEEN
+            else:
+                state.total_darks += 1
+                state.dark_queens += type == Type.QUEEN
+        state.turn_color = turn_color
+        state.hash_key = compute_hash(state)
+        return state
+
+    @classmethod
+    def from_bytes(cls, data):
+        # Reads the position written by to_bytes:
+        light, dark, queens, turn = POSITION.unpack(data)
+        state = cls.__new__(cls)
+        state.tiles = [Piece(Type.EMPTY) for _ in range(COLS * ROWS)]
+        for sq in range(SQUARES):
+            bit = 1 << sq
+            if not (light | dark) & bit:
+                continue
+            color = Color.LIGHT if light & bit else Color.DARK
+            type = Type.QUEEN if queens & bit else Type.BASE
+            state.tiles[SQ_TO_TILE[sq]] = Piece(type, color)
+        state.total_lights = light.bit_count()
+        state.light_queens = (light & queens).bit_count()
+        state.total_darks = dark.bit_count()
+        state.dark_queens = (dark & queens).bit_count()
+        state.turn_color = Color(turn)
+        state.hash_key = compute_hash(state)
+        state.evaluation = None
+        return state
+
+    def to_bytes(self):
+        return POSITION.pack(*self.bitboards(), self.turn_color.value)
+
+    def copy(self):
+        # Pieces are the only part that moves change in place, so they are
+        # all that needs copying. Evaluation isn't copied, searches set up
+        # their own:
+        state = self.__class__.__new__(self.__class__)
+        state.total_lights = self.total_lights
+        state.light_queens = self.light_queens
+        state.total_darks = self.total_darks
+        state.dark_queens = self.dark_queens
+        state.tiles = [Piece(piece.type, piece.color) for piece in self.tiles]
+        state.turn_color = self.turn_color
+        state.hash_key = self.hash_key
+        state.evaluation = None
+        return state
+
+    def state_result(self, moves=None):
+        # Already generated moves can be passed in to avoid generating
+        # them again, otherwise it is enough to know if any move exists:
         if self.total_lights == 0:
             return StateResult.DARK_WON
         if self.total_darks == 0:
             return StateResult.LIGHT_WON
-        if len(self.get_all_turn_moves()) == 0:
+        if moves is None:
+            if not self.has_moves():
+                return StateResult.DRAW
+        elif len(moves) == 0:
             return StateResult.DRAW
         return StateResult.PLAYING
 
@@ -57,10 +147,26 @@ class State(object):
     def atTile(self, tile):
         return self.tiles[tile]
 
+    def bitboards(self):
+        # Light, dark and queen masks as used by BitboardState:
+        light = dark = queens = 0
+        for sq in range(SQUARES):
+            piece = self.tiles[SQ_TO_TILE[sq]]
+            if piece.type == Type.EMPTY:
+                continue
+            if piece.color == Color.LIGHT:
+                light |= 1 << sq
+            else:
+                dark |= 1 << sq
+            if piece.type == Type.QUEEN:
+                queens |= 1 << sq
+        return light, dark, queens
+
     def at(self, row, col):
         return self.tiles[row * COLS + col]
 
     def change_turn_color(self):
+        self.hash_key ^= TURN_KEY
         if self.turn_color == Color.DARK:
             self.turn_color = Color.LIGHT
         else:
@@ -75,111 +181,91 @@ class State(object):
             self.generate_moves_for_tile(tile, all_moves)
         return all_moves
 
+    def has_moves(self):
+        for tile in range(COLS * ROWS):
+            piece = self.tiles[tile]
+            if piece.empty() or piece.color != self.turn_color:
+                continue
+            moves = []
+            self.generate_moves_for_tile(tile, moves)
+            if len(moves) != 0:
+                return True
+        return False
+
     def generate_moves_for_tile(self, org_tile, all_moves):
         o_piece = self.tiles[org_tile]
         if o_piece.empty() or o_piece.color != self.turn_color:
             return
 
-        o_row = org_tile // ROWS
-        o_col = org_tile % COLS
-
-        path = set([org_tile])
-
-        forward = -1 if o_piece.color == Color.LIGHT else 1
-        for vec in [(forward, 1), (forward, -1), (-forward, 1), (-forward, -1)]:
-            dr, dc = vec
-            if o_piece.is_base() and dr == -forward:
+        # Tiles visited by the jumping chain, one bit per tile:
+        path = 1 << org_tile
+        # Only base pieces get promoted, queens have nothing to reach:
+        promotion = PROMOTION_TILES[o_piece.color] if o_piece.is_base() else 0
+        neighbours = TILE_NEIGHBOUR[org_tile]
+        jumps = TILE_JUMP[org_tile]
+
+        for dir in MOVE_DIRECTIONS[o_piece.color, o_piece.type]:
+            # Short diagonal tile (forward left, ...), -1 if off the board:
+            s_tile = neighbours[dir]
+            if s_tile == -1:
                 continue
 
-            # Calculate short diagonal coords (forward left, ...):
-            s_row, s_col = o_row + dr, o_col + dc
-            # Validate so that they are inside the board:
-            if not (0 <= s_row < ROWS) or not (0 <= s_col < COLS):
-                continue
-
-            s_tile = s_row * COLS + s_col
             s_piece = self.tiles[s_tile]
             # Free space => valid move:
             if s_piece.empty():
-                # Check for potential queen promotion:
-                promoted = o_piece.is_base() and (
-                    (o_piece.color == Color.DARK and s_row == ROWS - 1)
-                    or (o_piece.color == Color.LIGHT and s_row == 0)
-                )
+                promoted = bool(promotion >> s_tile & 1)
                 all_moves.append(Move(org_tile, s_tile, None, promoted))
             # We can't jump over our pieces:
             elif s_piece.is_opposite_color(o_piece.color):
-                # Checking for tile in same direction that is
-                # behind the opponent piece:
-                l_row, l_col = s_row + dr, s_col + dc
-                if not (0 <= l_row < ROWS) or not (0 <= l_col < COLS):
+                # Tile in same direction that is behind the opponent piece:
+                l_tile = jumps[dir]
+                if l_tile == -1:
                     continue
 
-                l_tile = l_row * COLS + l_col
-                l_piece = self.tiles[l_tile]
-
                 # Free behind enemy => valid eating move:
-                if l_piece.empty():
-                    eaten = [EatenInfo(s_tile, s_piece.type, s_piece.color)]
-                    # Check for potential queen promotion:
-                    promoted = o_piece.is_base() and (
-                        (o_piece.color == Color.DARK and l_row == ROWS - 1)
-                        or (o_piece.color == Color.LIGHT and l_row == 0)
-                    )
+                if self.tiles[l_tile].empty():
+                    eaten = (EatenInfo(s_tile, s_piece.type, s_piece.color),)
+                    promoted = bool(promotion >> l_tile & 1)
 
-                    all_moves.append(Move(org_tile, l_tile, tuple(eaten), promoted))
+                    all_moves.append(Move(org_tile, l_tile, eaten, promoted))
                     self.generate_jumping_moves(
-                        org_tile, l_tile, vec, all_moves, eaten, path
+                        org_tile, l_tile, dir, all_moves, eaten, path
                     )
 
     def generate_jumping_moves(
-        self, org_tile, current_tile, dir, all_moves, eaten, path: set
+        self, org_tile, current_tile, dir, all_moves, eaten: tuple, path: int
     ):
-        path = set(path)
-        if current_tile in path:
+        if path & (1 << current_tile):
             return
 
-        path.add(current_tile)
+        path |= 1 << current_tile
         o_piece = self.tiles[org_tile]
-        c_row = current_tile // ROWS
-        c_col = current_tile % COLS
-
-        forward = -1 if o_piece.color == Color.LIGHT else 1
-        old_dr, old_dc = dir
-        for vec in [(forward, 1), (forward, -1), (-forward, 1), (-forward, -1)]:
-            dr, dc = vec
-            if (dr == -old_dr and dc == -old_dc) or (
-                o_piece.is_base() and dr == -forward
-            ):
+        promotion = PROMOTION_TILES[o_piece.color] if o_piece.is_base() else 0
+        neighbours = TILE_NEIGHBOUR[current_tile]
+        jumps = TILE_JUMP[current_tile]
+        # Jumping straight back where we came from isn't allowed:
+        back = OPPOSITE[dir]
+
+        for next_dir in MOVE_DIRECTIONS[o_piece.color, o_piece.type]:
+            if next_dir == back:
                 continue
 
-            s_row, s_col = c_row + dr, c_col + dc
-            if not (0 <= s_row < ROWS) or not (0 <= s_col < COLS):
+            s_tile = neighbours[next_dir]
+            l_tile = jumps[next_dir]
+            if l_tile == -1:
                 continue
 
-            s_tile = s_row * COLS + s_col
             s_piece = self.tiles[s_tile]
             if s_piece.empty() or s_piece.same_color_as(o_piece.color):
                 continue
 
-            l_row, l_col = s_row + dr, s_col + dc
-            if not (0 <= l_row < ROWS) or not (0 <= l_col < COLS):
-                continue
+            if self.tiles[l_tile].empty():
+                new_eaten = eaten + (EatenInfo(s_tile, s_piece.type, s_piece.color),)
+                promoted = bool(promotion >> l_tile & 1)
 
-            l_tile = l_row * COLS + l_col
-            l_piece = self.tiles[l_tile]
-            if l_piece.empty():
-                new_eaten = list(eaten)
-                new_eaten.append(EatenInfo(s_tile, s_piece.type, s_piece.color))
-                # Check for potential queen promotion:
-                promoted = o_piece.is_base() and (
-                    (o_piece.color == Color.DARK and l_row == ROWS - 1)
-                    or (o_piece.color == Color.LIGHT and l_row == 0)
-                )
-
-                all_moves.append(Move(org_tile, l_tile, tuple(new_eaten), promoted))
+                all_moves.append(Move(org_tile, l_tile, new_eaten, promoted))
                 self.generate_jumping_moves(
-                    org_tile, l_tile, vec, all_moves, new_eaten, path
+                    org_tile, l_tile, next_dir, all_moves, new_eaten, path
                 )
 
     def do_move(self, move: Move):
@@ -194,6 +280,7 @@ class State(object):
         self.tiles[start].type = Type.EMPTY
         self.tiles[dest].color = s_color
         self.tiles[dest].type = s_type
+        self.hash_key ^= PIECE_KEYS[(s_color, s_type)][start]
 
         # Promote if possible:
         if move.promoted:
@@ -202,10 +289,12 @@ class State(object):
                 self.dark_queens += 1
             else:
                 self.light_queens += 1
+        self.hash_key ^= PIECE_KEYS[(s_color, self.tiles[dest].type)][dest]
 
         # Removing eaten pieces:
         for info in move.eaten:
             self.tiles[info.tile].eat()
+            self.hash_key ^= PIECE_KEYS[(info.p_color, info.p_type)][info.tile]
             if info.p_color == Color.LIGHT:
                 if info.p_type == Type.QUEEN:
                     self.light_queens -= 1
@@ -215,6 +304,9 @@ class State(object):
                     self.dark_queens -= 1
                 self.total_darks -= 1
 
+        if self.evaluation is not None:
+            self.evaluation.do_move(move)
+
         self.change_turn_color()
 
     def undo_move(self, move: Move):
@@ -225,6 +317,7 @@ class State(object):
         for info in move.eaten:
             self.tiles[info.tile].color = info.p_color
             self.tiles[info.tile].type = info.p_type
+            self.hash_key ^= PIECE_KEYS[(info.p_color, info.p_type)][info.tile]
 
             if info.p_color == Color.LIGHT:
                 if info.p_type == Type.QUEEN:
@@ -235,6 +328,9 @@ class State(object):
                     self.dark_queens += 1
                 self.total_darks += 1
 
+        start_piece = self.tiles[start]
+        self.hash_key ^= PIECE_KEYS[(start_piece.color, start_piece.type)][start]
+
         # Demote if possible:
         if move.promoted:
             self.tiles[start].demote()
@@ -243,12 +339,15 @@ class State(object):
             else:
                 self.light_queens -= 1
 
-        start_piece = self.tiles[start]
         s_color, s_type = start_piece.color, start_piece.type
 
         # Updating start and dest tiles:
         self.tiles[start].type = Type.EMPTY
         self.tiles[dest].color = s_color
         self.tiles[dest].type = s_type
+        self.hash_key ^= PIECE_KEYS[(s_color, s_type)][dest]
+
+        if self.evaluation is not None:
+            self.evaluation.undo_move()
 
         self.change_turn_color()
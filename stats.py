@@ -0,0 +1,76 @@
+class SearchStats(object):
+    # Counters filled in by Computer while searching, Computer keeps None
+    # instead when they aren't wanted, so that disabled counting costs a
+    # single check per counted event:
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.nodes = 0
+        self.leaves = 0
+        self.evaluations = 0
+        self.quiescence_nodes = 0
+        # Nodes whose moves were generated and searched, and all their moves:
+        self.expanded = 0
+        self.children = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.tablebase_hits = 0
+        # (depth, seconds, nodes) of every finished iteration:
+        self.iterations = []
+
+    def add(self, other):
+        # Sums counters of searches that ran side by side:
+        for name, value in vars(other).items():
+            if name != "iterations":
+                setattr(self, name, getattr(self, name) + value)
+        self.iterations.extend(other.iterations)
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0
+
+    @property
+    def branching_factor(self):
+        # Average number of moves in searched positions:
+        return self.children / self.expanded if self.expanded else 0
+
+    @property
+    def effective_branching_factor(self):
+        # Growth of nodes from one iteration to the next:
+        if len(self.iterations) < 2 or not self.iterations[-2][2]:
+            return 0
+        return self.iterations[-1][2] / self.iterations[-2][2]
+
+    def as_dict(self):
+        result = {
+            name: value for name, value in vars(self).items() if name != "iterations"
+        }
+        result["iterations"] = [list(iteration) for iteration in self.iterations]
+        result["first_move_cutoff_rate"] = self.first_move_cutoff_rate
+        result["tt_hit_rate"] = self.tt_hit_rate
+        result["branching_factor"] = self.branching_factor
+        result["effective_branching_factor"] = self.effective_branching_factor
+        return result
+
+    def __str__(self):
+        lines = [
+            f"nodes {self.nodes}, leaves {self.leaves}, "
+            f"evaluations {self.evaluations}, quiescence {self.quiescence_nodes}",
+            f"cutoffs {self.cutoffs}, on first move "
+            f"{self.first_move_cutoff_rate:.1%}",
+            f"tt probes {self.tt_probes}, hits {self.tt_hit_rate:.1%}, "
+            f"cutoffs {self.tt_cutoffs}, tablebase hits {self.tablebase_hits}",
+            f"branching factor {self.branching_factor:.2f}, "
+            f"effective {self.effective_branching_factor:.2f}",
+        ]
+        for depth, seconds, nodes in self.iterations:
+            lines.append(f"depth {depth}: {seconds:.3f} s, {nodes} nodes")
+        return "\n".join(lines)
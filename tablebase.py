@@ -0,0 +1,351 @@
+import argparse
+import contextlib
+import io
+import math
+import mmap
+import random
+import struct
+import time
+from itertools import combinations, product
+from math import comb
+
+from bitboard import (
+    DARK_PROMOTION,
+    LIGHT_PROMOTION,
+    POSITION,
+    SQUARES,
+    TILE_TO_SQ,
+    BitboardState,
+    squares_of,
+)
+from piece import Color
+
+# Values are one byte from the view of the side on turn: 0 is a draw,
+# 1..127 a win and 128 + n a loss, n being the number of plies until the
+# game is over with best play:
+DRAW = 0
+LOSS = 128
+MAX_DISTANCE = 127
+
+# File starts with magic, version, max pieces and number of tables, then
+# (light bases, light queens, dark bases, dark queens, offset, size) of
+# every table, followed by the tables themselves:
+MAGIC = b"CKTB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+ENTRY = struct.Struct("<BBBBQI")
+
+# Scores of won positions, kept below the infinity of finished games and
+# falling with distance, so that quicker wins are preferred:
+TABLEBASE_WIN = 1000
+
+# Rank of a sorted tuple of squares among all tuples of its length:
+COMBINATIONS = [[comb(n, k) for k in range(SQUARES + 1)] for n in range(SQUARES + 1)]
+
+
+def rank(squares):
+    return sum(COMBINATIONS[sq][i + 1] for i, sq in enumerate(squares))
+
+
+def signatures(max_pieces):
+    # (light bases, light queens, dark bases, dark queens) of positions
+    # with up to max_pieces, both sides having at least one. Captures
+    # lower the piece count and promotions the number of bases, so every
+    # move leads to the same or an earlier signature in this order:
+    result = []
+    for lb, lq, db, dq in product(range(max_pieces + 1), repeat=4):
+        if lb + lq and db + dq and lb + lq + db + dq <= max_pieces:
+            result.append((lb, lq, db, dq))
+    result.sort(key=lambda sig: (sum(sig), sig[0] + sig[2], sig))
+    return result
+
+
+def table_size(sig):
+    size = 2
+    for count in sig:
+        size *= COMBINATIONS[SQUARES][count]
+    return size
+
+
+def signature_of(light, dark, queens):
+    return (
+        (light & ~queens).bit_count(),
+        (light & queens).bit_count(),
+        (dark & ~queens).bit_count(),
+        (dark & queens).bit_count(),
+    )
+
+
+def index_of(sig, light, dark, queens, turn_color):
+    index = 0
+    for count, bb in zip(
+        sig, (light & ~queens, light & queens, dark & ~queens, dark & queens)
+    ):
+        index = index * COMBINATIONS[SQUARES][count] + rank(tuple(squares_of(bb)))
+    return index * 2 + (turn_color == Color.DARK)
+
+
+def positions(sig):
+    # All (index, light, dark, queens, turn color) of a signature, pieces
+    # never share a square:
+    for groups in product(*(combinations(range(SQUARES), count) for count in sig)):
+        masks = [sum(1 << sq for sq in group) for group in groups]
+        light = masks[0] | masks[1]
+        dark = masks[2] | masks[3]
+        if (light | dark).bit_count() != sum(sig):
+            continue
+        queens = masks[1] | masks[3]
+        for turn_color in (Color.LIGHT, Color.DARK):
+            index = index_of(sig, light, dark, queens, turn_color)
+            yield index, light, dark, queens, turn_color
+
+
+def child_of(light, dark, queens, turn_color, move):
+    # Bitboards after the move, without going through do_move:
+    start = 1 << TILE_TO_SQ[move.start]
+    dest = 1 << TILE_TO_SQ[move.dest]
+    captured = move.captured_squares
+    if turn_color == Color.LIGHT:
+        light ^= start | dest
+        dark &= ~captured
+    else:
+        dark ^= start | dest
+        light &= ~captured
+    was_queen = queens & start
+    queens &= ~(captured | start)
+    if was_queen or move.promoted:
+        queens |= dest
+    return light, dark, queens
+
+
+def generate_table(sig, tables):
+    # Retrograde analysis of one signature, positions after captures and
+    # promotions are already in tables. Positions are resolved in order
+    # of their distance, so every win is the quickest and every loss the
+    # slowest one. buckets[n] holds (index, value) of positions found to
+    # be over in n plies, parents lead back over moves within signature:
+    values = bytearray(table_size(sig))
+    parents = {}
+    # Moves within signature not yet known to lose, or -1 for positions
+    # that can't be lost, and longest win of opponent after such moves:
+    remaining = {}
+    longest = {}
+    buckets = [[] for _ in range(MAX_DISTANCE + 1)]
+    state = BitboardState()
+
+    for index, light, dark, queens, turn_color in positions(sig):
+        state.light, state.dark, state.queens = light, dark, queens
+        state.turn_color = turn_color
+        moves = set(state.get_all_turn_moves())
+        # Without moves game is a draw:
+        if not moves:
+            continue
+
+        next_color = Color.DARK if turn_color == Color.LIGHT else Color.LIGHT
+        count = 0
+        # Some move wins or draws:
+        safe = False
+        for move in moves:
+            c_light, c_dark, c_queens = child_of(light, dark, queens, turn_color, move)
+            if not c_light or not c_dark:
+                # Last enemy piece taken:
+                buckets[1].append((index, 1))
+                safe = True
+                continue
+            c_sig = signature_of(c_light, c_dark, c_queens)
+            c_index = index_of(c_sig, c_light, c_dark, c_queens, next_color)
+            if c_sig == sig:
+                parents.setdefault(c_index, []).append(index)
+                count += 1
+                continue
+
+            value = tables[c_sig][c_index]
+            if value >= LOSS:
+                add_win(buckets, index, value - LOSS + 1)
+                safe = True
+            elif value == DRAW:
+                safe = True
+            else:
+                longest[index] = max(longest.get(index, 0), value)
+
+        remaining[index] = -1 if safe else count
+        # Every move leaves the signature and loses:
+        if remaining[index] == 0:
+            add_loss(buckets, index, longest[index] + 1)
+
+    for distance in range(1, MAX_DISTANCE + 1):
+        for index, value in buckets[distance]:
+            if values[index]:
+                continue
+            values[index] = value
+
+            for parent in parents.get(index, ()):
+                if values[parent]:
+                    continue
+                if value >= LOSS:
+                    # Moving here wins for the parent:
+                    add_win(buckets, parent, distance + 1)
+                elif remaining[parent] > 0:
+                    longest[parent] = max(longest.get(parent, 0), distance)
+                    remaining[parent] -= 1
+                    if remaining[parent] == 0:
+                        add_loss(buckets, parent, longest[parent] + 1)
+    return values
+
+
+def add_win(buckets, index, distance):
+    if distance > MAX_DISTANCE:
+        raise ValueError("Distance doesn't fit in a byte")
+    buckets[distance].append((index, distance))
+
+
+def add_loss(buckets, index, distance):
+    if distance > MAX_DISTANCE:
+        raise ValueError("Distance doesn't fit in a byte")
+    buckets[distance].append((index, LOSS + distance))
+
+
+def generate(max_pieces, verbose=True):
+    tables = {}
+    for sig in signatures(max_pieces):
+        start = time.perf_counter()
+        tables[sig] = generate_table(sig, tables)
+        if verbose:
+            values = tables[sig]
+            wins = sum(1 for value in values if 0 < value < LOSS)
+            losses = sum(1 for value in values if value >= LOSS)
+            print(
+                f"{sig}: {len(values)} positions, {wins} wins, {losses} losses "
+                f"in {time.perf_counter() - start:.1f} s"
+            )
+    return tables
+
+
+def write(path, tables, max_pieces):
+    offset = HEADER.size + ENTRY.size * len(tables)
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, max_pieces, len(tables)))
+        for sig, values in tables.items():
+            file.write(ENTRY.pack(*sig, offset, len(values)))
+            offset += len(values)
+        for values in tables.values():
+            file.write(values)
+
+
+class Tablebase(object):
+    # Reads values straight from the mapped file, the operating system
+    # loads only the pages that are probed:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.max_pieces, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a tablebase file")
+        self.offsets = {}
+        for i in range(count):
+            *sig, offset, _ = ENTRY.unpack_from(self.data, HEADER.size + i * ENTRY.size)
+            self.offsets[tuple(sig)] = offset
+
+    def __reduce__(self):
+        # Worker processes map the file again:
+        return (Tablebase, (self.path,))
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def probe(self, light, dark, queens, turn_color):
+        # Value of the position or None when it isn't in the tablebase:
+        if (light | dark).bit_count() > self.max_pieces:
+            return None
+        sig = signature_of(light, dark, queens)
+        offset = self.offsets.get(sig)
+        if offset is None:
+            return None
+        return self.data[offset + index_of(sig, light, dark, queens, turn_color)]
+
+    def score(self, state):
+        # Score from light's view as used by Computer, None if unknown:
+        value = self.probe(*state.bitboards(), state.turn_color)
+        if value is None:
+            return None
+        if value == DRAW:
+            score = 0
+        elif value < LOSS:
+            score = TABLEBASE_WIN - value
+        else:
+            score = value - LOSS - TABLEBASE_WIN
+        return score if state.turn_color == Color.LIGHT else -score
+
+
+def random_position(rng, pieces):
+    # Position with given number of pieces, both sides having some, bases
+    # on their promotion row are queens already:
+    squares = rng.sample(range(SQUARES), pieces)
+    light = sum(1 << sq for sq in squares[: rng.randint(1, pieces - 1)])
+    dark = sum(1 << sq for sq in squares) & ~light
+    queens = sum(1 << sq for sq in squares if rng.random() < 0.5)
+    queens |= light & LIGHT_PROMOTION | dark & DARK_PROMOTION
+    return POSITION.pack(light, dark, queens, rng.choice(list(Color)).value)
+
+
+def check_lines(path, positions=200, depth=6, seed=0):
+    # Searches random positions a bit larger than the tablebase with it
+    # attached, every move of the expected line has to be legal and
+    # batched leaves have to score the same as the ones searched one by one:
+    from computer import Computer
+    from state import State
+
+    tablebase = Tablebase(path)
+    rng = random.Random(seed)
+    for _ in range(positions):
+        state = State.from_bytes(
+            random_position(rng, tablebase.max_pieces + rng.randint(1, 2))
+        )
+        if state.is_terminal():
+            continue
+        scores = []
+        for batch_leaves in (False, True):
+            ai = Computer(
+                math.inf, depth, tablebase=tablebase, batch_leaves=batch_leaves
+            )
+            with contextlib.redirect_stdout(io.StringIO()):
+                ai.get_next_best_move(state)
+            scores.append(ai.completed_depths[-1][1])
+
+            line = state.copy()
+            for move in ai.principal_variation:
+                if move not in line.get_all_turn_moves():
+                    raise AssertionError(
+                        f"Illegal move {move} in {ai.principal_variation}:\n{state}"
+                    )
+                line.do_move(move)
+        if scores[0] != scores[1]:
+            raise AssertionError(f"Batched score differs {scores}:\n{state}")
+    return positions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endgame tablebase generator.")
+    parser.add_argument("--pieces", type=int, default=3)
+    parser.add_argument("--output", default="tablebase.bin")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="search random positions with the existing file instead",
+    )
+    args = parser.parse_args()
+
+    if args.check:
+        print(f"Checked {check_lines(args.output)} positions")
+        return
+
+    tables = generate(args.pieces)
+    write(args.output, tables, args.pieces)
+    print(f"Written {args.output}")
+
+
+if __name__ == "__main__":
+    main()
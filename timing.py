@@ -0,0 +1,162 @@
+import math
+import threading
+import time
+
+from utility import GamePhase, TimeOutException
+
+# Soft limit is the time after which no new iteration is started, hard limit
+# is the time at which the running one is given up, both as shares of the
+# time limit. They are the same in every phase unless phase_limits gives
+# others, e.g. less for openings, which are cheap to get roughly right:
+PHASE_LIMITS = {phase: (0.7, 1.0) for phase in GamePhase}
+
+# Phase is told by the number of pieces left on the board:
+OPENING_PIECES = 20
+ENDGAME_PIECES = 8
+
+# Effective branching factor, used until two iterations are known and as
+# bounds for the measured one:
+DEFAULT_GROWTH = 4
+MIN_GROWTH = 1.5
+MAX_GROWTH = 8
+
+FIRST_CHECK_NODES = 16
+MAX_CHECK_NODES = 1 << 16
+
+
+def game_phase(state):
+    pieces = state.total_lights + state.total_darks
+    if pieces >= OPENING_PIECES:
+        return GamePhase.OPENING
+    if pieces <= ENDGAME_PIECES:
+        return GamePhase.ENDGAME
+    return GamePhase.MIDDLEGAME
+
+
+class TimeManager(object):
+    # Search calls check only once next_check nodes are reached, between
+    # two checks are about check_interval_sec worth of nodes at the node
+    # rate measured so far:
+    def __init__(self, check_interval_sec=0.005, phase_limits=None):
+        self.check_interval_sec = check_interval_sec
+        self.phase_limits = phase_limits if phase_limits is not None else PHASE_LIMITS
+        self.start_time = 0
+        self.soft_limit = math.inf
+        self.hard_limit = math.inf
+        self.phase_shares = (1, 1)
+        self.next_check = FIRST_CHECK_NODES
+        self.last_check_time = 0
+        self.last_check_nodes = 0
+        self.iteration_start = 0
+        self.iteration_start_nodes = 0
+        self.iteration_times = []
+        self.iteration_nodes = []
+        # Set from another thread to stop the search at its next check.
+        # Every search may be given its own, which then can be set even
+        # before the search has started:
+        self.cancel_event = threading.Event()
+        # Ponderhit may come from another thread before the ponder search
+        # has even started, it's then kept as (time, time limit) for start:
+        self.lock = threading.Lock()
+        self.ponder_pending = False
+        self.hit = None
+
+    def start(self, time_limit_sec, state=None, nodes=0, cancel_event=None):
+        soft, hard = (1, 1)
+        if state is not None:
+            soft, hard = self.phase_limits[game_phase(state)]
+        with self.lock:
+            self.phase_shares = (soft, hard)
+            self.start_time = time.perf_counter()
+            self.soft_limit = time_limit_sec * soft
+            self.hard_limit = time_limit_sec * hard
+            if self.hit is not None:
+                self.set_limits(*self.hit)
+            self.ponder_pending = False
+            self.hit = None
+        self.next_check = nodes + FIRST_CHECK_NODES
+        self.last_check_time = self.start_time
+        self.last_check_nodes = nodes
+        self.iteration_times = []
+        self.iteration_nodes = []
+        if cancel_event is None:
+            cancel_event = threading.Event()
+        self.cancel_event = cancel_event
+
+    def set_limits(self, since, time_limit_sec):
+        soft, hard = self.phase_shares
+        offset = since - self.start_time
+        self.soft_limit = offset + time_limit_sec * soft
+        self.hard_limit = offset + time_limit_sec * hard
+
+    def expect_ponder(self):
+        # Called before ponder search is handed to its thread:
+        with self.lock:
+            self.ponder_pending = True
+            self.hit = None
+
+    def ponderhit(self, time_limit_sec):
+        # Search started without limits gets them, counted from now:
+        with self.lock:
+            if self.ponder_pending:
+                self.hit = (time.perf_counter(), time_limit_sec)
+            else:
+                self.set_limits(time.perf_counter(), time_limit_sec)
+
+    def cancel(self):
+        with self.lock:
+            self.ponder_pending = False
+            self.hit = None
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def check(self, nodes):
+        now = time.perf_counter()
+        if self.cancelled or now - self.start_time > self.hard_limit:
+            raise TimeOutException()
+
+        interval = MAX_CHECK_NODES
+        if now > self.last_check_time:
+            rate = (nodes - self.last_check_nodes) / (now - self.last_check_time)
+            interval = min(int(rate * self.check_interval_sec), MAX_CHECK_NODES)
+        self.next_check = nodes + max(interval, 1)
+        self.last_check_time = now
+        self.last_check_nodes = nodes
+
+    def start_iteration(self, nodes=0):
+        self.iteration_start = time.perf_counter()
+        self.iteration_start_nodes = nodes
+
+    def finish_iteration(self, nodes=0):
+        self.iteration_times.append(time.perf_counter() - self.iteration_start)
+        self.iteration_nodes.append(nodes - self.iteration_start_nodes)
+
+    def next_iteration_fits(self):
+        # Next iteration should cost the last one's time times the effective
+        # branching factor, the growth of nodes from the iteration before:
+        if self.cancelled:
+            return False
+        if not self.iteration_times:
+            return True
+        elapsed = self.elapsed()
+        if elapsed >= self.soft_limit:
+            return False
+
+        # Iterations answered from the table kept since the last search take
+        # next to no time and say nothing about growth:
+        last = self.iteration_times[-1]
+        growth = DEFAULT_GROWTH
+        if (
+            len(self.iteration_times) >= 2
+            and self.iteration_times[-2] >= self.check_interval_sec
+            and self.iteration_nodes[-2] > 0
+        ):
+            growth = self.iteration_nodes[-1] / self.iteration_nodes[-2]
+            growth = min(MAX_GROWTH, max(MIN_GROWTH, growth))
+        return elapsed + last * growth <= self.hard_limit
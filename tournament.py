@@ -0,0 +1,174 @@
+import argparse
+import ast
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from computer import Computer
+from parallel import ParallelComputer
+from piece import Color
+from state import State
+from utility import StateResult
+
+# z for 95% confidence intervals:
+CONFIDENCE_Z = 1.96
+
+
+def parse_player(text):
+    # "time=0.2,depth=8,use_bitboards=True" into Computer settings, time
+    # and depth stand for time_limit_sec and max_depth, pvs for use_pvs,
+    # workers above 1 make it a ParallelComputer:
+    player = {"time_limit_sec": 0.2, "max_depth": 64, "use_pvs": False, "workers": 1}
+    aliases = {"time": "time_limit_sec", "depth": "max_depth", "pvs": "use_pvs"}
+    for item in filter(None, text.split(",")):
+        name, _, value = item.partition("=")
+        name = aliases.get(name.strip(), name.strip())
+        try:
+            player[name] = ast.literal_eval(value.strip()) if value else True
+        except (ValueError, SyntaxError):
+            player[name] = value.strip()
+    return player
+
+
+def init_worker():
+    # Searches report their progress, which is only noise here:
+    sys.stdout = open(os.devnull, "w")
+
+
+def random_opening(plies, seed):
+    rng = random.Random(seed)
+    state = State()
+    for _ in range(plies):
+        moves = state.get_all_turn_moves()
+        if not moves or state.is_terminal():
+            break
+        state.do_move(rng.choice(moves))
+    return state
+
+
+def play_game(light, dark, opening_plies, seed, move_cap):
+    # Plays one game from a random opening, returns its result and
+    # (nodes, seconds) spent by light and dark:
+    state = random_opening(opening_plies, seed)
+    players = {}
+    for color, player in ((Color.LIGHT, light), (Color.DARK, dark)):
+        options = dict(player)
+        use_pvs = options.pop("use_pvs")
+        time_limit_sec = options.pop("time_limit_sec")
+        max_depth = options.pop("max_depth")
+        workers = options.pop("workers")
+        if workers > 1:
+            ai = ParallelComputer(time_limit_sec, max_depth, workers, **options)
+        else:
+            ai = Computer(time_limit_sec, max_depth, **options)
+        players[color] = (ai, use_pvs)
+    work = {Color.LIGHT: [0, 0], Color.DARK: [0, 0]}
+
+    plies = 0
+    while state.state_result() == StateResult.PLAYING and plies < move_cap:
+        ai, use_pvs = players[state.turn_color]
+        start = time.perf_counter()
+        move = ai.get_next_best_move(state, use_pvs=use_pvs)
+        work[state.turn_color][0] += ai.nodes
+        work[state.turn_color][1] += time.perf_counter() - start
+        state.do_move(move)
+        plies += 1
+
+    for ai, _ in players.values():
+        if isinstance(ai, ParallelComputer):
+            ai.shutdown()
+
+    # Games that hit the move cap count as draws:
+    result = state.state_result()
+    if result == StateResult.PLAYING:
+        result = StateResult.DRAW
+    return result, work[Color.LIGHT], work[Color.DARK]
+
+
+def summarize(scores):
+    # Mean score of the first player with its confidence interval and
+    # the matching Elo difference:
+    games = len(scores)
+    mean = sum(scores) / games
+    variance = sum((score - mean) ** 2 for score in scores) / max(games - 1, 1)
+    margin = CONFIDENCE_Z * math.sqrt(variance / games)
+    return mean, margin
+
+
+def elo(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Computer against computer games.")
+    parser.add_argument("--first", default="", help="settings of first player")
+    parser.add_argument("--second", default="", help="settings of second player")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--opening-plies", type=int, default=4)
+    parser.add_argument("--move-cap", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    first = parse_player(args.first)
+    second = parse_player(args.second)
+    print(f"first:  {first}")
+    print(f"second: {second}")
+
+    # Every opening is played twice, with both players on each side:
+    scores = []
+    counts = {"win": 0, "draw": 0, "loss": 0}
+    work = {"first": [0, 0], "second": [0, 0]}
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as pool:
+        futures = {}
+        for game in range(args.games):
+            first_is_light = game % 2 == 0
+            light, dark = (first, second) if first_is_light else (second, first)
+            seed = args.seed + game // 2
+            future = pool.submit(
+                play_game, light, dark, args.opening_plies, seed, args.move_cap
+            )
+            futures[future] = first_is_light
+
+        for future in as_completed(futures):
+            first_is_light = futures[future]
+            result, light_work, dark_work = future.result()
+            first_work, second_work = (
+                (light_work, dark_work) if first_is_light else (dark_work, light_work)
+            )
+            for side, side_work in (("first", first_work), ("second", second_work)):
+                work[side][0] += side_work[0]
+                work[side][1] += side_work[1]
+
+            if result == StateResult.DRAW:
+                score, outcome = 0.5, "draw"
+            elif (result == StateResult.LIGHT_WON) == first_is_light:
+                score, outcome = 1, "win"
+            else:
+                score, outcome = 0, "loss"
+            scores.append(score)
+            counts[outcome] += 1
+            print(
+                f"game {len(scores):4}: {outcome:4}  "
+                f"+{counts['win']} ={counts['draw']} -{counts['loss']}"
+            )
+
+    mean, margin = summarize(scores)
+    print(
+        f"first player: +{counts['win']} ={counts['draw']} -{counts['loss']}, "
+        f"score {mean:.3f} +- {margin:.3f}, "
+        f"elo {elo(mean):+.0f} [{elo(mean - margin):+.0f}, {elo(mean + margin):+.0f}]"
+    )
+    for side, (nodes, seconds) in work.items():
+        print(f"{side:6} {nodes / max(seconds, 1e-9):10.0f} n/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Rough size of one stored entry (tuple, key, score and list slot),
+# used to turn the memory cap into a number of slots:
+ENTRY_SIZE_BYTES = 160
+
+
+class TranspositionTable(object):
+    def __init__(self, size_mb=16):
+        # Number of buckets is a power of two so that indexing is a mask,
+        # every bucket holds two entries:
+        buckets = max(1, size_mb * 1024 * 1024 // (2 * ENTRY_SIZE_BYTES))
+        self.size = 1 << (buckets.bit_length() - 1)
+        self.mask = self.size - 1
+
+        # Two-tier replacement, first tier only gives up its entry for
+        # one searched at least as deep, second tier always takes the
+        # newest entry:
+        self.deep = [None] * self.size
+        self.recent = [None] * self.size
+        # Table is kept between searches, first tier entries of earlier
+        # ones give way to any new entry, whatever its depth:
+        self.generation = 0
+        self.generations = bytearray(self.size)
+
+    def clear(self):
+        self.deep = [None] * self.size
+        self.recent = [None] * self.size
+        self.generation = 0
+        self.generations = bytearray(self.size)
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    def probe(self, key):
+        # Entries are (key, depth, flag, score, move) tuples:
+        index = key & self.mask
+        entry = self.deep[index]
+        if entry is not None and entry[0] == key:
+            return entry
+        entry = self.recent[index]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        index = key & self.mask
+        entry = (key, depth, flag, score, move)
+        old = self.deep[index]
+        if (
+            old is None
+            or old[0] == key
+            or depth >= old[1]
+            or self.generations[index] != self.generation
+        ):
+            # Kicked out deep entry still gets a chance in the second tier:
+            if old is not None and old[0] != key:
+                self.recent[index] = old
+            self.deep[index] = entry
+            self.generations[index] = self.generation
+        else:
+            self.recent[index] = entry
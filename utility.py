@@ -63,6 +63,12 @@ class GameState(Enum):
     GAME_OVER = 4
 
 
+class GamePhase(Enum):
+    OPENING = 1
+    MIDDLEGAME = 2
+    ENDGAME = 3
+
+
 class GameMode(Enum):
     PLAYER_VS_PLAYER = 1
     PLAYER_VS_COMPUTER = 2
@@ -0,0 +1,28 @@
+import random
+
+from piece import Color, Type
+from utility import COLS, ROWS
+
+# Keys are generated from a fixed seed, so the same position always gets
+# the same hash, even between runs (needed for anything stored on disk):
+_rng = random.Random(0x5EED)
+
+# PIECE_KEYS[(color, type)][tile] is the key of a piece standing on a tile:
+PIECE_KEYS = {
+    (color, type): [_rng.getrandbits(64) for _ in range(ROWS * COLS)]
+    for color in Color
+    for type in (Type.BASE, Type.QUEEN)
+}
+
+# Toggled whenever turn changes, set while dark is on turn:
+TURN_KEY = _rng.getrandbits(64)
+
+
+def compute_hash(state):
+    # Hash from scratch, states keep theirs updated incrementally:
+    key = TURN_KEY if state.turn_color == Color.DARK else 0
+    for tile in range(ROWS * COLS):
+        piece = state.atTile(tile)
+        if not piece.empty():
+            key ^= PIECE_KEYS[(piece.color, piece.type)][tile]
+    return key